@@ -0,0 +1,228 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+from lexical_index import LexicalIndex, tokenize
+from vector_db import read_ingest_marker
+
+_EEID = re.compile(r"\bE\d{5}\b", re.IGNORECASE)
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:[.,]\d+)*")
+_CAPITALIZED = re.compile(r"\b[A-Z][\w'-]*")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Canonical form used for exact matching: lowercase, single spaces, no trailing punctuation.
+    """
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def normalize_vector(vector) -> Optional[np.ndarray]:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def question_entities(question: str, lexical: Optional[LexicalIndex] = None) -> frozenset:
+    """
+    What a question is about: employee ids, numbers, capitalized words after the first
+    (cities, titles, names) and the employee names and departments known to the lexical index,
+    which also catches them when typed in lowercase.
+    """
+    entities = {"id:" + eeid.upper() for eeid in _EEID.findall(question)}
+    entities.update("number:" + number.replace(",", "") for number in _NUMBER.findall(question))
+    _, _, rest = question.strip().partition(" ")
+    entities.update("word:" + word.lower() for word in _CAPITALIZED.findall(rest) if not _EEID.fullmatch(word))
+    if lexical is None:
+        return frozenset(entities)
+
+    tokens = tokenize(question)
+    for size in (4, 3, 2):
+        for start in range(len(tokens) - size + 1):
+            span = " ".join(tokens[start:start + size])
+            if span in lexical.names:
+                entities.add("name:" + span)
+    padded = f" {' '.join(tokens)} "
+    for department in lexical.departments:
+        department = " ".join(tokenize(department))
+        if department and f" {department} " in padded:
+            entities.add("department:" + department)
+    return frozenset(entities)
+
+
+class _Entry:
+    __slots__ = ("answer", "vector", "entities", "expires_at")
+
+    def __init__(self, answer: str, vector: Optional[np.ndarray], entities: Optional[frozenset],
+                 expires_at: float):
+        self.answer = answer
+        self.vector = vector
+        self.entities = entities
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache partitioned by RBAC scope.
+    - Exact tier: (scope, normalized question) lookup.
+    - Semantic tier: cosine similarity against cached questions of the same scope only, and
+      only those about the same entities (`entity_fn`): "salary of E01234" and "salary of
+      E04321" embed almost identically but must not share an answer.
+    Entries expire after `ttl_s`, the least recently used are evicted beyond `max_entries`,
+    and everything is dropped when the ingest marker in `persist_directory` changes.
+    """
+
+    def __init__(self, embed_fn: Optional[Callable[[str], list]], max_entries: int, ttl_s: float,
+                 similarity_threshold: float, persist_directory: Optional[str] = None,
+                 ingest_check_interval_s: float = 10.0,
+                 entity_fn: Callable[[str], frozenset] = question_entities):
+        self.embed_fn = embed_fn
+        self.entity_fn = entity_fn
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.similarity_threshold = similarity_threshold
+        self.persist_directory = persist_directory
+        self.ingest_check_interval_s = ingest_check_interval_s
+
+        self._lock = threading.Lock()
+        # (scope, normalized question) -> _Entry, least recently used first
+        self._entries = OrderedDict()
+        # scope -> set of normalized questions, so semantic search never leaves the scope
+        self._by_scope = {}
+
+        self._ingest_version = read_ingest_marker(persist_directory) if persist_directory else None
+        self._next_ingest_check = time.monotonic() + ingest_check_interval_s
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.entity_mismatches = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def lookup(self, scope: tuple, question: str,
+               vector: Optional[np.ndarray] = None) -> tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Return (answer, question_vector). The answer is None on a miss; the vector, when computed
+        for the semantic tier, should be passed back to `store` to avoid embedding twice.
+        Callers that already embedded the question can pass its `normalize_vector`-ed embedding.
+        """
+        self._check_ingest_marker()
+        key = (scope, normalize_question(question))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.exact_hits += 1
+                    return entry.answer, entry.vector
+                self._remove(key)
+                self.expirations += 1
+            has_candidates = bool(self._by_scope.get(scope))
+
+        if self.embed_fn is not None and has_candidates:
+            if vector is None:
+                vector = self._embed(question)
+            if vector is not None:
+                answer = self._semantic_lookup(scope, vector, self.entity_fn(question), now)
+                if answer is not None:
+                    return answer, vector
+
+        with self._lock:
+            self.misses += 1
+        return None, vector
+
+    def store(self, scope: tuple, question: str, answer: str, vector: Optional[np.ndarray] = None):
+        entities = None
+        if self.embed_fn is not None:
+            if vector is None:
+                vector = self._embed(question)
+            entities = self.entity_fn(question)
+        key = (scope, normalize_question(question))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(answer, vector, entities, time.monotonic() + self.ttl_s)
+            self._by_scope.setdefault(scope, set()).add(key[1])
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "entity_mismatches": self.entity_mismatches,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _semantic_lookup(self, scope: tuple, vector: np.ndarray, entities: frozenset,
+                         now: float) -> Optional[str]:
+        with self._lock:
+            keys = [(scope, q) for q in self._by_scope.get(scope, ())]
+            candidates = [
+                (key, self._entries[key]) for key in keys
+                if self._entries[key].vector is not None and self._entries[key].expires_at > now
+            ]
+            if not candidates:
+                return None
+            matrix = np.stack([entry.vector for _, entry in candidates])
+            similarities = matrix @ vector
+            same_entities = np.fromiter((entry.entities == entities for _, entry in candidates),
+                                        dtype=bool, count=len(candidates))
+            best = int(np.argmax(np.where(same_entities, similarities, -np.inf)))
+            if not same_entities[best] or similarities[best] < self.similarity_threshold:
+                # Count near-duplicates that were only refused for naming someone or something else
+                if similarities.max() >= self.similarity_threshold:
+                    self.entity_mismatches += 1
+                return None
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return entry.answer
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(self.embed_fn(question), dtype=np.float32)
+        except Exception as e:
+            logging.warning(f"Answer cache embedding failed, skipping semantic tier: {e}")
+            return None
+        return normalize_vector(vector)
+
+    def _remove(self, key: tuple):
+        del self._entries[key]
+        scope_keys = self._by_scope.get(key[0])
+        if scope_keys is not None:
+            scope_keys.discard(key[1])
+            if not scope_keys:
+                del self._by_scope[key[0]]
+
+    def _check_ingest_marker(self):
+        if not self.persist_directory or time.monotonic() < self._next_ingest_check:
+            return
+        self._next_ingest_check = time.monotonic() + self.ingest_check_interval_s
+        version = read_ingest_marker(self.persist_directory)
+        if version != self._ingest_version:
+            self._ingest_version = version
+            self.clear()
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta, datetime
 from pydantic import BaseModel
 from app.crud.user import user_crud
 from app.security.jwt_handler import jwt_manager
-from app.security.dependencies import get_db_session as get_db
+from app.security.dependencies import get_admin_user, get_db_session as get_db
 from app.models.users import UserRoleEnum
+from app.security.login_throttle import AccountLocked, login_throttle
+from app.services.provisioning import read_employee_rows, user_provisioner
+from app.config import provisioning_config
+from typing import Optional
+import csv
+import math
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -23,18 +29,44 @@ class UserCreate(BaseModel):
     department: str
     role: UserRoleEnum = UserRoleEnum.employee
 
+class UserAccessUpdate(BaseModel):
+    role: Optional[UserRoleEnum] = None
+    department: Optional[str] = None
+    is_active: Optional[bool] = None
+
+def too_many_attempts(retry_after_s: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many failed login attempts. Please retry later.",
+        headers={"Retry-After": str(max(math.ceil(retry_after_s), 1))},
+    )
+
 @router.post("/login", response_model=LoginResponse)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
-    user = await user_crud.authenticate_user(db, form_data.username, form_data.password)
+    # Throttled and known-locked attempts are refused before any DB query or bcrypt work
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = login_throttle.retry_after(form_data.username, client_ip)
+    if retry_after is not None:
+        raise too_many_attempts(retry_after)
+
+    try:
+        user = await user_crud.authenticate_user(db, form_data.username, form_data.password)
+    except AccountLocked as e:
+        login_throttle.failed(form_data.username, client_ip)
+        login_throttle.lock(form_data.username, e.retry_after_s)
+        raise too_many_attempts(e.retry_after_s)
     if not user:
+        login_throttle.failed(form_data.username, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_throttle.succeeded(form_data.username)
     
     token_data = {"user_id": user.id, "username": user.username, "role": user.role.value}
     access_token = jwt_manager.create_access_token(token_data, timedelta(hours=8))
@@ -75,3 +107,52 @@ async def register(
     )
     
     return {"message": "User created successfully", "user_id": user.id}
+
+@router.post("/provision", dependencies=[Depends(get_admin_user)])
+async def provision_users(
+    file: Optional[UploadFile] = File(None, description="Employee CSV export; defaults to the bundled dataset"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Create accounts for every employee in the export (username = EEID) with temporary passwords.
+    Existing users are skipped; the report lists per-row errors and the new credentials.
+    """
+    if file is not None:
+        data = await file.read()
+    else:
+        try:
+            with open(provisioning_config.Dataset_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No file uploaded and the default employee dataset was not found"
+            )
+    try:
+        rows = read_employee_rows(data)
+    except csv.Error as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unreadable CSV: {e}")
+    return await user_provisioner.provision(db, rows)
+
+@router.patch("/users/{user_id}/access", dependencies=[Depends(get_admin_user)])
+async def update_user_access(
+    user_id: str,
+    update: UserAccessUpdate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Change a user's role, department or active flag. This worker drops the user's cached
+    principals at once; other workers keep serving the old access for up to PRINCIPAL_CACHE_TTL_S.
+    """
+    user = await user_crud.update_user_access(
+        db, user_id, role=update.role, department=update.department, is_active=update.is_active
+    )
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return {
+        "id": user.id,
+        "username": user.username,
+        "role": user.role.value,
+        "department": user.department,
+        "is_active": user.is_active
+    }
@@ -1,19 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.security.dependencies import get_current_user, get_db_session as get_db
+from app.security.principal_cache import UserPrincipal
 from datetime import datetime
-from app.models.users import User
-from vector_db import VectorDB
-from llm_chain import CustomOrgChatChain
+from app.services.inference import batch_pool, inference_pool, InferenceQueueFull, InferenceTimeout
+from app.services.single_flight import single_flight
+from app.config import inference_config, chat_history_config
+from app.crud.chat import chat_crud
+from app.services.chat_log import chat_log_writer
+from app.monitoring.metrics import time_to_first_token_seconds
+from typing import Optional
+import base64
+import json
 import logging
+import time
 
 router = APIRouter(prefix="/api", tags=["Chat"])
 
-# Initialize vector DB and chat chain globally
-vector_db = VectorDB(collection_name="org_employees", persist_directory="./chroma_persist")
-chat_chain = CustomOrgChatChain(vector_db)
-
 class ChatRequest(BaseModel):
     message: str
 
@@ -23,37 +28,94 @@ class ChatResponse(BaseModel):
     timestamp: str
     access_granted: bool = True
 
+class BatchChatRequest(BaseModel):
+    questions: list[str] = Field(..., min_length=1)
+    # Server-Sent Events as answers finish; otherwise one JSON response in question order
+    stream: bool = True
+
+class BatchChatResult(BaseModel):
+    index: int
+    question: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+    access_granted: bool = True
+
+def check_restricted_query(current_user: UserPrincipal, message: str) -> Optional[ChatResponse]:
+    """
+    Return an access-denied response if the message touches terms the user's role may not query.
+    """
+    restricted_queries = {
+        "employee": ["team salaries", "employee directory", "payroll", "salary", "wage", "bonus", "compensation"],
+        "manager": [],
+        "admin": []
+    }
+    
+    user_restrictions = restricted_queries.get(current_user.role.value, [])
+    
+    # Check if query contains restricted terms
+    if any(restriction in message.lower() for restriction in user_restrictions):
+        return ChatResponse(
+            response=f"Access Denied — Your role ({current_user.role.value}) does not permit this query. Please contact your administrator for access to this information.",
+            source="Access Control System",
+            timestamp=datetime.now().isoformat(),
+            access_granted=False
+        )
+    return None
+
+def get_chat_chain(request: Request):
+    """
+    The chat chain built by the app's lifespan; 503 while it is still loading.
+    """
+    runtime = request.app.state.chat_runtime
+    if runtime.chat_chain is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant is starting up. Please retry shortly.",
+            headers={"Retry-After": str(inference_config.Retry_after_s)}
+        )
+    return runtime.chat_chain
+
+def coalescing_key(current_user: UserPrincipal, message: str) -> tuple:
+    """
+    Requests with the same key get the same answer, so they can share one generation.
+    """
+    # Loaded with the chat runtime; importing at module level would pull in langchain/chroma
+    from vector_db import rbac_scope
+    from answer_cache import normalize_question
+    scope = rbac_scope(current_user.role.value, current_user.department or "Unknown")
+    return scope, normalize_question(message)
+
+def sse_event(event: str, data) -> str:
+    """
+    Format one Server-Sent Event frame.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(
     request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    chat_chain=Depends(get_chat_chain)
 ):
     try:
         # Role-based access control check
-        restricted_queries = {
-            "employee": ["team salaries", "employee directory", "payroll", "salary", "wage"],
-            "manager": [],
-            "admin": []
-        }
-        
-        user_restrictions = restricted_queries.get(current_user.role.value, [])
+        denied = check_restricted_query(current_user, request.message)
+        if denied:
+            chat_log_writer.record(current_user.id, request.message, denied.response, "denied")
+            return denied
         
-        # Check if query contains restricted terms
-        if any(restriction in request.message.lower() for restriction in user_restrictions):
-            return ChatResponse(
-                response=f"Access Denied — Your role ({current_user.role.value}) does not permit this query. Please contact your administrator for access to this information.",
-                source="Access Control System",
-                timestamp=datetime.now().isoformat(),
-                access_granted=False
+        # Process the chat request on the inference workers so the event loop stays free;
+        # identical questions already in flight for the same scope share that run
+        response = await single_flight.do(
+            coalescing_key(current_user, request.message),
+            lambda: inference_pool.run(
+                chat_chain.ask,
+                question=request.message,
+                user_role=current_user.role.value,
+                user_department=current_user.department or "Unknown"
             )
-        
-        # Process the chat request
-        response = chat_chain.ask(
-            question=request.message,
-            user_role=current_user.role.value,
-            user_department=current_user.department or "Unknown"
         )
+        chat_log_writer.record(current_user.id, request.message, response, "success")
         
         return ChatResponse(
             response=response,
@@ -62,6 +124,18 @@ async def chat_endpoint(
             access_granted=True
         )
         
+    except InferenceQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="The assistant is busy. Please retry shortly.",
+            headers={"Retry-After": str(inference_config.Retry_after_s)}
+        )
+    except InferenceTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant took too long to respond. Please retry.",
+            headers={"Retry-After": str(inference_config.Retry_after_s)}
+        )
     except Exception as e:
         logging.error(f"Chat endpoint error: {e}")
         raise HTTPException(
@@ -69,20 +143,225 @@ async def chat_endpoint(
             detail="An error occurred while processing your request."
         )
 
+@router.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    http_request: Request,
+    current_user: UserPrincipal = Depends(get_current_user),
+    chat_chain=Depends(get_chat_chain)
+):
+    """
+    Stream the answer as Server-Sent Events: `sources` first, then `token` events, then `done`.
+    """
+    started = time.perf_counter()
+    denied = check_restricted_query(current_user, request.message)
+    if denied:
+        chat_log_writer.record(current_user.id, request.message, denied.response, "denied")
+        async def denied_stream():
+            yield sse_event("denied", denied.model_dump())
+            yield sse_event("done", {"timestamp": denied.timestamp, "access_granted": False})
+        return StreamingResponse(denied_stream(), media_type="text/event-stream")
+
+    try:
+        # Admission happens here so a full queue is still a plain 429 response.
+        # Joining an identical in-flight stream replays its events so far, then follows it live.
+        events = single_flight.stream(
+            coalescing_key(current_user, request.message),
+            lambda: inference_pool.stream(
+                chat_chain.stream,
+                question=request.message,
+                user_role=current_user.role.value,
+                user_department=current_user.department or "Unknown"
+            )
+        )
+    except InferenceQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="The assistant is busy. Please retry shortly.",
+            headers={"Retry-After": str(inference_config.Retry_after_s)}
+        )
+
+    async def event_stream():
+        tokens = []
+        try:
+            async for kind, payload in events:
+                if await http_request.is_disconnected():
+                    break
+                if kind == "token":
+                    if not tokens:
+                        time_to_first_token_seconds.observe(time.perf_counter() - started)
+                    tokens.append(payload)
+                    payload = {"token": payload}
+                yield sse_event(kind, payload)
+            else:
+                chat_log_writer.record(current_user.id, request.message, "".join(tokens), "success")
+                yield sse_event("done", {"timestamp": datetime.now().isoformat(), "access_granted": True})
+        except InferenceTimeout:
+            yield sse_event("error", {"detail": "The assistant took too long to respond. Please retry."})
+        except Exception as e:
+            logging.error(f"Chat stream error: {e}")
+            yield sse_event("error", {"detail": "An error occurred while processing your request."})
+        finally:
+            # Stops generation on the worker once no client is following it
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/chat/batch")
+async def chat_batch_endpoint(
+    request: BatchChatRequest,
+    http_request: Request,
+    current_user: UserPrincipal = Depends(get_current_user),
+    chat_chain=Depends(get_chat_chain)
+):
+    """
+    Answer a list of questions under the caller's RBAC scope, e.g. for reporting jobs.
+    Streams a `result` event per question as it finishes, then `done`; with `stream: false`
+    the results are returned together in question order.
+    """
+    if len(request.questions) > inference_config.Batch_max_questions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch may contain at most {inference_config.Batch_max_questions} questions."
+        )
+
+    denied_results = []
+    allowed = []
+    for index, question in enumerate(request.questions):
+        denied = check_restricted_query(current_user, question)
+        if denied:
+            chat_log_writer.record(current_user.id, question, denied.response, "denied")
+            denied_results.append(BatchChatResult(
+                index=index, question=question, response=denied.response, access_granted=False
+            ))
+        else:
+            allowed.append(index)
+
+    events = None
+    if allowed:
+        try:
+            # The batch is coordinated on its own pool; only its generations use inference workers
+            events = batch_pool.stream(
+                chat_chain.ask_batch,
+                questions=[request.questions[index] for index in allowed],
+                user_role=current_user.role.value,
+                user_department=current_user.department or "Unknown",
+                timeout=inference_config.Batch_timeout_s
+            )
+        except InferenceQueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="The assistant is busy. Please retry shortly.",
+                headers={"Retry-After": str(inference_config.Retry_after_s)}
+            )
+
+    async def results():
+        for result in denied_results:
+            yield result
+        if events is None:
+            return
+        async for position, response, error in events:
+            index = allowed[position]
+            question = request.questions[index]
+            chat_log_writer.record(current_user.id, question, response or error, "error" if error else "success")
+            yield BatchChatResult(index=index, question=question, response=response, error=error)
+
+    if not request.stream:
+        ordered = [None] * len(request.questions)
+        try:
+            async for result in results():
+                ordered[result.index] = result
+        except InferenceTimeout:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The batch did not finish in time. Please retry with fewer questions.",
+                headers={"Retry-After": str(inference_config.Retry_after_s)}
+            )
+        except Exception as e:
+            logging.error(f"Chat batch error: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="An error occurred while processing your request."
+            )
+        finally:
+            if events is not None:
+                await events.aclose()
+        return {"results": ordered, "timestamp": datetime.now().isoformat()}
+
+    async def event_stream():
+        completed = 0
+        try:
+            async for result in results():
+                if await http_request.is_disconnected():
+                    break
+                completed += 1
+                yield sse_event("result", result.model_dump())
+            else:
+                yield sse_event("done", {"timestamp": datetime.now().isoformat(), "count": completed})
+        except InferenceTimeout:
+            yield sse_event("error", {"detail": "The batch did not finish in time.", "completed": completed})
+        except Exception as e:
+            logging.error(f"Chat batch stream error: {e}")
+            yield sse_event("error", {"detail": "An error occurred while processing your request.",
+                                      "completed": completed})
+        finally:
+            # Cancels generations that have not started once no client is following
+            if events is not None:
+                await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def encode_history_cursor(timestamp: datetime, message_id: str) -> str:
+    """
+    Opaque, URL-safe cursor; a raw isoformat() would carry a "+00:00" that query strings turn into a space.
+    """
+    raw = f"{timestamp.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, message_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), message_id
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid history cursor")
+
 @router.get("/chat/history")
 async def get_chat_history(
-    current_user: User = Depends(get_current_user),
+    limit: int = Query(chat_history_config.Page_size, ge=1, le=chat_history_config.Max_page_size),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    current_user: UserPrincipal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    # Mock chat history for now - you can implement database storage
+    """
+    Newest-first chat history using keyset pagination on (timestamp, id).
+    """
+    before = decode_history_cursor(cursor) if cursor else None
+    # One extra row tells us whether another page exists
+    messages = await chat_crud.get_history(db, current_user.id, limit + 1, before)
+    page = messages[:limit]
+    next_cursor = None
+    if len(messages) > limit:
+        next_cursor = encode_history_cursor(page[-1].timestamp, page[-1].id)
+
     return {
         "history": [
             {
-                "id": "1",
-                "query": "How many vacation days do I have left?",
-                "response": "You have 7 vacation days remaining as of today.",
-                "timestamp": "2025-09-08T10:00:00Z",
-                "status": "success"
+                "id": message.id,
+                "query": message.query,
+                "response": message.response,
+                "timestamp": message.timestamp.isoformat(),
+                "status": message.status
             }
-        ]
+            for message in page
+        ],
+        "next_cursor": next_cursor
     }
@@ -0,0 +1,33 @@
+from datetime import datetime
+from sqlalchemy import insert, tuple_
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.chat import ChatMessage
+
+class ChatCRUD:
+    def __init__(self):
+        pass
+
+    async def add_messages(self, db: AsyncSession, rows: list[dict]) -> None:
+        """
+        Insert many chat messages in one multi-row statement.
+        """
+        if not rows:
+            return
+        await db.execute(insert(ChatMessage), rows)
+        await db.commit()
+
+    async def get_history(self, db: AsyncSession, user_id: str, limit: int,
+                          before: tuple[datetime, str] | None = None) -> list[ChatMessage]:
+        """
+        Newest-first page of a user's messages, strictly older than the (timestamp, id) cursor.
+        """
+        query = select(ChatMessage).where(ChatMessage.user_id == user_id)
+        if before is not None:
+            query = query.where(tuple_(ChatMessage.timestamp, ChatMessage.id) < tuple_(*before))
+        query = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit)
+        result = await db.execute(query)
+        return list(result.scalars().all())
+
+
+chat_crud = ChatCRUD()
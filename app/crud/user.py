@@ -1,10 +1,23 @@
 import uuid
+from sqlalchemy import and_, case, func, update
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.users import User, UserRoleEnum
 from app.security.password import password_manager
+from app.security.principal_cache import principal_cache
+from app.security.login_throttle import AccountLocked
+from app.config import security_config
 from datetime import datetime, timedelta,timezone
 
+def _utcnow() -> datetime:
+    # The timestamp columns are timezone-naive and hold UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _as_naive_utc(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 class UserCRUD:
     def __init__(self):
         pass
@@ -25,7 +38,7 @@ class UserCRUD:
             username=username,
             email=email,
             full_name=full_name,
-            hashed_password=password_manager.hash_password(password),
+            hashed_password=await password_manager.hash_password_async(password),
             department=department,
             role=role,
             is_active=True,
@@ -37,23 +50,80 @@ class UserCRUD:
         return user
 
     async def authenticate_user(self, db: AsyncSession, username: str, password: str) -> User | None:
+        """
+        Verify credentials with one SELECT, then record the outcome with one UPDATE ... RETURNING.
+        Raises AccountLocked while the account is locked, and on the failure that locks it.
+        """
         user = await self.get_user_by_username(db, username)
         if not user:
             return None
-        
-        # Check lockout
-        if user.locked_until and datetime.now(timezone.utc) < user.locked_until:
-            return None
 
-        if not password_manager.verify_password(password, user.hashed_password):
-            # Increment lockout logic here (optional)
+        now = _utcnow()
+        locked_until = _as_naive_utc(user.locked_until)
+        if locked_until and now < locked_until:
+            raise AccountLocked((locked_until - now).total_seconds())
+
+        verified, new_hash = await password_manager.verify_and_update_async(password, user.hashed_password)
+        if not verified:
+            await self._record_failed_login(db, user.id, now)
             return None
 
-        # Successful login, reset failed attempts
-        user.failed_login_attempts = 0
-        user.last_login = datetime.now(timezone.utc)
+        values = {"failed_login_attempts": 0, "locked_until": None, "last_login": now}
+        # Stored hash used outdated bcrypt rounds; upgrade it while we have the plain password
+        if new_hash:
+            values["hashed_password"] = new_hash
+        # RETURNING refreshes the loaded user in place, so no second SELECT is needed
+        result = await db.execute(
+            update(User).where(User.id == user.id).values(**values).returning(User)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        user = result.scalars().first()
         await db.commit()
-        await db.refresh(user)
+        return user
+
+    async def _record_failed_login(self, db: AsyncSession, user_id: str, now: datetime):
+        """
+        Count a failed login in the database and lock the account once it reaches the limit.
+        The increment happens in SQL so concurrent failures are all counted.
+        """
+        # A lockout that has run out starts a fresh count
+        lock_expired = and_(User.locked_until.is_not(None), User.locked_until <= now)
+        attempts = case((lock_expired, 1), else_=func.coalesce(User.failed_login_attempts, 0) + 1)
+        result = await db.execute(
+            update(User).where(User.id == user_id)
+            .values(
+                failed_login_attempts=attempts,
+                locked_until=case(
+                    (attempts >= security_config.Max_failed_logins,
+                     now + timedelta(seconds=security_config.Lockout_s)),
+                    (lock_expired, None),
+                    else_=User.locked_until,
+                ),
+            )
+            .returning(User.locked_until)
+            .execution_options(synchronize_session=False)
+        )
+        locked_until = _as_naive_utc(result.scalar())
+        await db.commit()
+        if locked_until and now < locked_until:
+            raise AccountLocked((locked_until - now).total_seconds())
+
+    async def update_user_access(self, db: AsyncSession, user_id: str, role: UserRoleEnum | None = None,
+                                 department: str | None = None, is_active: bool | None = None) -> User | None:
+        """
+        Change what a user may access and drop their cached principals so it applies immediately.
+        """
+        user = await self.get_user_by_id(db, user_id)
+        if not user:
+            return None
+        if role is not None:
+            user.role = role
+        if department is not None:
+            user.department = department
+        if is_active is not None:
+            user.is_active = is_active
+        await db.commit()
+        principal_cache.invalidate_user(user_id)
         return user
 
 
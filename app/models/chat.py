@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Index
+from app.databases.session import Base
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    query = Column(Text, nullable=False)
+    response = Column(Text, nullable=False)
+    # success, denied or error
+    status = Column(String, nullable=False, default="success")
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # Serves the per-user, newest-first keyset pagination of /api/chat/history
+        Index("ix_chat_messages_user_id_timestamp", "user_id", "timestamp", "id"),
+    )
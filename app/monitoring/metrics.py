@@ -0,0 +1,247 @@
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from app.monitoring.tracing import record_span, start_trace
+
+# Seconds; covers sub-millisecond cache hits up to slow generations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 10, 20, 50)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about four characters per token) without loading a tokenizer.
+    """
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus registry: counters and histograms updated in place, plus
+    collectors that turn the components' existing stats() dicts into gauges at scrape time.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(f"{self.namespace}_{name}", help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.namespace}_{name}", help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, prefix: str, stats_fn: Callable[[], dict]):
+        """
+        Export every numeric value of stats_fn() as gauge `<namespace>_<prefix>_<key>`.
+        """
+        self._collectors.append((prefix, stats_fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats_fn in self._collectors:
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{self.namespace}_{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry("chatbot")
+
+stage_seconds = registry.histogram(
+    "stage_seconds", "Time spent in each chat pipeline stage", ("stage",))
+time_to_first_token_seconds = registry.histogram(
+    "time_to_first_token_seconds", "Streamed chats: request start to first generated token")
+retrieved_documents = registry.histogram(
+    "retrieved_documents", "Documents returned by retrieval per question", buckets=COUNT_BUCKETS)
+prompt_tokens = registry.histogram(
+    "prompt_tokens", "Estimated prompt tokens per generation", buckets=TOKEN_BUCKETS)
+completion_tokens = registry.histogram(
+    "completion_tokens", "Estimated completion tokens per generation", buckets=TOKEN_BUCKETS)
+routing_decisions_total = registry.counter(
+    "routing_decisions_total", "Model tier chosen per generated answer, and why", ("tier", "reason"))
+generation_seconds = registry.histogram(
+    "generation_seconds", "LLM generation time per model tier", ("tier",))
+prompt_documents_dropped = registry.counter(
+    "prompt_documents_dropped_total", "Retrieved documents left out of prompts by the token budget")
+answers_total = registry.counter(
+    "answers_total", "Answers by where they came from", ("source",))
+inference_queue_wait_seconds = registry.histogram(
+    "inference_queue_wait_seconds", "Time admitted requests wait for an inference worker")
+db_pool_wait_seconds = registry.histogram(
+    "db_pool_wait_seconds", "Time to check out a database connection")
+http_request_seconds = registry.histogram(
+    "http_request_seconds", "HTTP request latency until the response starts", ("method", "route", "status"))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Time a pipeline stage into stage_seconds and the current request's trace.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        record_span(stage, elapsed)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by route template. With tracing on, it also
+    assigns or propagates a trace id and returns it, with the stage timings recorded before
+    the response started, in the response headers.
+    """
+
+    def __init__(self, app, tracing: bool = True, trace_header: str = "X-Trace-Id",
+                 slow_request_ms: float = 0):
+        self.app = app
+        self.tracing = tracing
+        self.trace_header = trace_header.lower().encode("latin-1")
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = None
+        if self.tracing:
+            incoming = dict(scope.get("headers") or []).get(self.trace_header)
+            trace = start_trace(incoming.decode("latin-1") if incoming else None)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                route = scope.get("route")
+                http_request_seconds.observe(
+                    time.perf_counter() - started,
+                    method=scope["method"],
+                    # Templates, not raw paths, keep the label set bounded
+                    route=getattr(route, "path", "unmatched"),
+                    status=status_code,
+                )
+                if trace is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((self.trace_header, trace.trace_id.encode("latin-1")))
+                    if trace.spans:
+                        headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if trace is not None and self.slow_request_ms and elapsed_ms >= self.slow_request_ms:
+                logging.warning(
+                    f"Slow request {scope['method']} {scope['path']} {status_code} {elapsed_ms:.0f}ms "
+                    f"trace={trace.trace_id} stages=[{trace.server_timing()}]"
+                )
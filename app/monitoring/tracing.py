@@ -0,0 +1,43 @@
+import re
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Trace:
+    """
+    Per-request trace: the id echoed to the client and the stage timings recorded so far.
+    """
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        # (stage, seconds), appended from the event loop and the inference workers
+        self.spans = []
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.spans)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def start_trace(incoming_id: Optional[str] = None) -> Trace:
+    """
+    Begin a trace for the current context, keeping a well-formed incoming id.
+    """
+    trace_id = incoming_id if incoming_id and _VALID_TRACE_ID.match(incoming_id) else uuid.uuid4().hex
+    trace = Trace(trace_id)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_span(stage: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append((stage, seconds))
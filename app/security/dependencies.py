@@ -1,27 +1,42 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
-from sqlalchemy.ext.asyncio import AsyncSession
 from app.security.jwt_handler import jwt_manager
-from app.databases.session import get_db_session
+# Re-exported: routers import the session dependency from here
+from app.databases.session import AsyncSessionLocal, get_db_session
 from app.crud.user import user_crud
-from app.models.users import User, UserRoleEnum
+from app.models.users import UserRoleEnum
+from app.security.principal_cache import principal_cache, UserPrincipal
+from app.monitoring.metrics import stage_timer
 
 security = HTTPBearer(auto_error=False)
 
-async def get_db_session() -> AsyncSession:
+async def resolve_principal(token: str) -> Optional[UserPrincipal]:
     """
-    Dependency to get SQLAlchemy Async DB session
+    Map a bearer token to the active user's principal, using the DB only on a cache miss.
+    Raises 401 for invalid or expired tokens.
     """
-    async for session in get_db_session():
-         yield session
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = jwt_manager.verify_token(token)
+    # A session is only checked out when the cache cannot answer
+    with stage_timer("auth_db_lookup"):
+        async with AsyncSessionLocal() as db:
+            user = await user_crud.get_user_by_id(db, payload.get("user_id"))
+    if not user or not user.is_active:
+        return None
+
+    principal = UserPrincipal.from_user(user)
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
 
 async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: AsyncSession = Depends(get_db_session)
-) -> User:
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> UserPrincipal:
     """
-    Validate JWT token from Authorization header and fetch user from DB.
+    Validate JWT token from Authorization header and resolve the user, cached per token.
     Raises 401 if invalid or missing.
     """
     if not credentials:
@@ -30,19 +45,17 @@ async def get_current_user(
             detail="Authentication credentials required",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    token = credentials.credentials
-    payload = jwt_manager.verify_token(token)
-    user = await user_crud.get_user_by_id(db, payload.get("user_id"))
-    if not user or not user.is_active:
+    principal = await resolve_principal(credentials.credentials)
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User inactive or not found"
         )
-    return user
+    return principal
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_user)
+) -> UserPrincipal:
     """
     Ensure user account is active
     """
@@ -51,8 +64,8 @@ async def get_current_active_user(
     return current_user
 
 async def get_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_user)
+) -> UserPrincipal:
     """
     Ensure user is admin
     """
@@ -64,8 +77,8 @@ async def get_admin_user(
     return current_user
 
 async def get_manager_or_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_user)
+) -> UserPrincipal:
     """
     Ensure user is manager or admin
     """
@@ -77,20 +90,14 @@ async def get_manager_or_admin_user(
     return current_user
 
 async def get_optional_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: AsyncSession = Depends(get_db_session)
-) -> Optional[User]:
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> Optional[UserPrincipal]:
     """
     Optional authentication dependency — returns user if authenticated, else None.
     """
     if not credentials:
         return None
     try:
-        token = credentials.credentials
-        payload = jwt_manager.verify_token(token)
-        user = await user_crud.get_user_by_id(db, payload.get("user_id"))
-        if user and user.is_active:
-            return user
-        return None
+        return await resolve_principal(credentials.credentials)
     except Exception:
         return None
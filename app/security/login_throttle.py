@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from app.config import security_config
+
+
+class AccountLocked(Exception):
+    """Raised when an account is locked after too many failed logins."""
+
+    def __init__(self, retry_after_s: float):
+        super().__init__(f"Account locked for another {retry_after_s:.0f}s")
+        self.retry_after_s = retry_after_s
+
+
+class LoginThrottle:
+    """
+    Sliding-window count of failed logins per username and per client IP, plus the lockouts
+    the database has reported. Checked before any bcrypt or DB work, so credential-stuffing
+    traffic is turned away cheaply. Per process and size-bounded: the oldest keys are dropped first.
+    """
+
+    def __init__(self, window_s: float, max_per_user: int, max_per_ip: int, max_keys: int):
+        self.window_s = window_s
+        self.max_per_user = max_per_user
+        self.max_per_ip = max_per_ip
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> monotonic times of recent failures, least recently failed first
+        self._failures = OrderedDict()
+        # username -> monotonic time the lockout ends
+        self._locked = {}
+        self.rejected = 0
+
+    @staticmethod
+    def _user_key(username: str) -> str:
+        return "user:" + username.strip().lower()
+
+    def _recent(self, key: str, now: float) -> Optional[deque]:
+        failures = self._failures.get(key)
+        if failures is None:
+            return None
+        while failures and failures[0] <= now - self.window_s:
+            failures.popleft()
+        if not failures:
+            del self._failures[key]
+            return None
+        return failures
+
+    def retry_after(self, username: str, client_ip: str) -> Optional[float]:
+        """
+        Seconds until this attempt may be made, or None if it may go ahead.
+        """
+        now = time.monotonic()
+        user_key = self._user_key(username)
+        waits = []
+        with self._lock:
+            locked_until = self._locked.get(user_key)
+            if locked_until is not None:
+                if locked_until > now:
+                    waits.append(locked_until - now)
+                else:
+                    del self._locked[user_key]
+            for key, limit in ((user_key, self.max_per_user), ("ip:" + client_ip, self.max_per_ip)):
+                failures = self._recent(key, now)
+                if failures is not None and len(failures) >= limit:
+                    # Allowed again once the oldest counted failure leaves the window
+                    waits.append(failures[-limit] + self.window_s - now)
+            if waits:
+                self.rejected += 1
+        return max(waits) if waits else None
+
+    def failed(self, username: str, client_ip: str):
+        now = time.monotonic()
+        with self._lock:
+            for key in (self._user_key(username), "ip:" + client_ip):
+                failures = self._recent(key, now)
+                if failures is None:
+                    failures = self._failures[key] = deque()
+                failures.append(now)
+                self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def lock(self, username: str, duration_s: float):
+        with self._lock:
+            self._locked[self._user_key(username)] = time.monotonic() + duration_s
+            while len(self._locked) > self.max_keys:
+                self._locked.pop(next(iter(self._locked)))
+
+    def succeeded(self, username: str):
+        # The client IP keeps its count: one valid account does not vouch for the rest of its traffic
+        with self._lock:
+            self._failures.pop(self._user_key(username), None)
+            self._locked.pop(self._user_key(username), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracked_keys": len(self._failures),
+                "locked_accounts": len(self._locked),
+                "rejected": self.rejected,
+            }
+
+
+# Global instance
+login_throttle = LoginThrottle(
+    window_s=security_config.Login_throttle_window_s,
+    max_per_user=security_config.Login_throttle_per_user,
+    max_per_ip=security_config.Login_throttle_per_ip,
+    max_keys=security_config.Login_throttle_max_keys,
+)
@@ -1,20 +1,67 @@
 from passlib.context import CryptContext
 from passlib.hash import bcrypt
+import asyncio
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
+from app.config import security_config
 
-class PasswordManager:
-  def __init__(self):
-    #configure bcrypt 
-    self.pwd_context=CryptContext(
+_worker_contexts = {}
+
+def _crypt_context(rounds:int)-> CryptContext:
+  "bcrypt context where any hash not using `rounds` is flagged for rehash"
+  context=_worker_contexts.get(rounds)
+  if context is None:
+    context=CryptContext(
       schemes=["bcrypt"],
       deprecated="auto",
-      bcrypt__rounds=12
+      bcrypt__rounds=rounds,
+      bcrypt__min_rounds=rounds,
+      bcrypt__max_rounds=rounds
     )
+    _worker_contexts[rounds]=context
+  return context
+
+# Module-level so they can be pickled into the process pool
+def _hash_in_worker(password:str, rounds:int)-> str:
+  return _crypt_context(rounds).hash(password)
+
+def _hash_many_in_worker(passwords:list[str], rounds:int)-> list[str]:
+  context=_crypt_context(rounds)
+  return [context.hash(password) for password in passwords]
+
+def _verify_in_worker(plain_password:str, hashed_password:str, rounds:int)-> tuple[bool,Optional[str]]:
+  try:
+    return _crypt_context(rounds).verify_and_update(plain_password,hashed_password)
+  except Exception as e:
+    print(f"Password Verfication error:{e}")
+    return False, None
+
+class PasswordManager:
+  def __init__(self):
+    #configure bcrypt
+    self.rounds=security_config.Bcrypt_rounds
+    self.pwd_context=_crypt_context(self.rounds)
+    # bcrypt runs in worker processes so it never blocks the event loop
+    self.max_workers=security_config.Password_workers
+    self.max_concurrency=security_config.Password_max_concurrency
+    # bulk jobs get their own processes, so interactive calls never queue behind them
+    self.bulk_workers=max(security_config.Password_bulk_workers,1)
+    self._executor=None
+    self._semaphore=None
+    self._bulk_executor=None
+    self.bulk_running=0
+    self.waiting=0
+    self.running=0
+    self.completed=0
+    self.peak_waiting=0
+    self.total_wait_s=0.0
+
   def hash_pass(self,password:str)-> str:
     "Hash a pass using bcrypt with salt "
     return self.pwd_context.hash(password)
-  
+
   def verify_password(self,plain_password:str, hashed_password:str)-> bool:
     "verify plain password against its hash"
     "Returns: True if matches"
@@ -23,6 +70,74 @@ class PasswordManager:
     except Exception as e:
       print(f"Password Verfication error:{e}")
       return False
+
+  def _ensure_pool(self):
+    if self._executor is None:
+      self._executor=ProcessPoolExecutor(max_workers=self.max_workers)
+      self._semaphore=asyncio.Semaphore(self.max_concurrency)
+
+  async def _run(self,fn,*args):
+    "run a bcrypt call in the process pool, at most max_concurrency at a time"
+    self._ensure_pool()
+    queued_at=time.perf_counter()
+    self.waiting+=1
+    self.peak_waiting=max(self.peak_waiting,self.waiting)
+    try:
+      await self._semaphore.acquire()
+    finally:
+      self.waiting-=1
+    self.total_wait_s+=time.perf_counter()-queued_at
+    self.running+=1
+    try:
+      return await asyncio.get_running_loop().run_in_executor(self._executor,fn,*args)
+    finally:
+      self.running-=1
+      self.completed+=1
+      self._semaphore.release()
+
+  async def hash_password_async(self,password:str)-> str:
+    "Hash a password off the event loop"
+    return await self._run(_hash_in_worker,password,self.rounds)
+
+  async def hash_passwords_async(self,passwords:list[str],chunk_size:int=8)-> list[str]:
+    "Hash many passwords in parallel, keeping their order"
+    "Runs on the bulk worker processes, never the ones serving logins"
+    if self._bulk_executor is None:
+      self._bulk_executor=ProcessPoolExecutor(max_workers=self.bulk_workers)
+    loop=asyncio.get_running_loop()
+    chunks=[passwords[i:i+chunk_size] for i in range(0,len(passwords),chunk_size)]
+    self.bulk_running+=1
+    try:
+      hashed=await asyncio.gather(*(loop.run_in_executor(self._bulk_executor,_hash_many_in_worker,chunk,self.rounds)
+                                    for chunk in chunks))
+    finally:
+      self.bulk_running-=1
+    return [password_hash for chunk in hashed for password_hash in chunk]
+
+  async def verify_and_update_async(self,plain_password:str, hashed_password:str)-> tuple[bool,Optional[str]]:
+    "verify off the event loop"
+    "Returns: (matches, new hash if the stored one uses outdated rounds else None)"
+    return await self._run(_verify_in_worker,plain_password,hashed_password,self.rounds)
+
+  def stats(self)-> dict:
+    return {
+      "workers":self.max_workers,
+      "max_concurrency":self.max_concurrency,
+      "bulk_workers":self.bulk_workers,
+      "bulk_running":self.bulk_running,
+      "waiting":self.waiting,
+      "running":self.running,
+      "completed":self.completed,
+      "peak_waiting":self.peak_waiting,
+      "avg_wait_ms":round(self.total_wait_s/self.completed*1000,2) if self.completed else 0.0,
+    }
+
+  def shutdown(self):
+    if self._executor is not None:
+      self._executor.shutdown(wait=False,cancel_futures=True)
+    if self._bulk_executor is not None:
+      self._bulk_executor.shutdown(wait=False,cancel_futures=True)
+
   def validate_pass_str(self,password:str)-> tuple[bool,list[str]]:
     "validate against security policies"
     errors=[]
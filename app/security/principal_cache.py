@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config import security_config
+from app.models.users import User, UserRoleEnum
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """
+    The authenticated user as seen by request handlers, detached from any DB session.
+    """
+    id: str
+    username: str
+    full_name: str
+    role: UserRoleEnum
+    department: Optional[str]
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserPrincipal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            full_name=user.full_name,
+            role=user.role,
+            department=user.department,
+            is_active=user.is_active,
+        )
+
+
+class PrincipalCache:
+    """
+    Short-lived, size-bounded map of verified access token -> UserPrincipal.
+    Entries never outlive the token's own expiry, and can be dropped per user
+    when their role or active flag changes.
+    """
+
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # token digest -> (principal, expires_at), least recently used first
+        self._entries = OrderedDict()
+        # user id -> token digests, for invalidation
+        self._by_user = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Raw bearer tokens are never kept in memory
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[UserPrincipal]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, principal: UserPrincipal, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl_s
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        key = self._key(token)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (principal, expires_at)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: str):
+        """
+        Drop every cached token of a user, e.g. after deactivation or a role change.
+        """
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key: str):
+        principal, _ = self._entries.pop(key)
+        keys = self._by_user.get(principal.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[principal.id]
+
+
+# Global instance
+principal_cache = PrincipalCache(
+    ttl_s=security_config.Principal_cache_ttl_s,
+    max_entries=security_config.Principal_cache_max_entries,
+)
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config import chat_history_config
+from app.crud.chat import chat_crud
+from app.databases.session import AsyncSessionLocal
+
+
+class ChatLogWriter:
+    """
+    Write-behind buffer for chat history. `record` only enqueues, so logging never adds
+    latency to a chat response; a background task inserts the messages in batches.
+    """
+
+    def __init__(self, batch_size: int, flush_interval_s: float, max_pending: int):
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record(self, user_id: str, query: str, response: str, status: str = "success"):
+        if self._queue is None:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait({
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "query": query,
+                "response": response,
+                "status": status,
+                "timestamp": datetime.now(timezone.utc),
+            })
+        except asyncio.QueueFull:
+            # The database is falling behind; losing history beats slowing down chat
+            self.dropped += 1
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop accepting messages, write whatever is still buffered and end the flusher.
+        """
+        if self._task is None:
+            return
+        queue, self._queue = self._queue, None
+        # Sentinel: everything queued before it gets flushed first
+        await queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Wait up to one flush interval for a fuller batch
+            deadline = loop.time() + self.flush_interval_s
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[dict]):
+        if not batch:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await chat_crud.add_messages(db, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logging.error(f"Chat history flush of {len(batch)} messages failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+# Global instance
+chat_log_writer = ChatLogWriter(
+    batch_size=chat_history_config.Batch_size,
+    flush_interval_s=chat_history_config.Flush_interval_s,
+    max_pending=chat_history_config.Max_pending,
+)
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.config import runtime_config
+from app.monitoring.metrics import registry
+
+
+class ChatRuntime:
+    """
+    Owns the vector store and chat chain for the lifetime of the app. They are built in the
+    background after startup, then the models are loaded into Ollama and the indexes touched,
+    so the first user request does not pay for a cold start. `ready` flips once that is done.
+    """
+
+    def __init__(self, collection_name: str, persist_directory: str, warm_up: bool = True):
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.warm_up_enabled = warm_up
+        self.chat_chain = None
+        self.ready = False
+        self.status = "starting"
+        self.error: Optional[str] = None
+        self.load_s = None
+        self.warm_up_s = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._initialize())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _initialize(self):
+        started = time.perf_counter()
+        while self.chat_chain is None:
+            try:
+                self.status = "loading"
+                self.chat_chain = await asyncio.to_thread(self._build)
+            except Exception as e:
+                self._failed("Chat runtime failed to load", e)
+                await asyncio.sleep(runtime_config.Warmup_retry_s)
+        self.load_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        while self.warm_up_enabled:
+            try:
+                self.status = "warming"
+                await asyncio.wait_for(asyncio.to_thread(self._warm_up), runtime_config.Warmup_timeout_s)
+                break
+            except Exception as e:
+                # Chat is already served; readiness waits until the models answer
+                self._failed("Model warm-up failed", e)
+                await asyncio.sleep(runtime_config.Warmup_retry_s)
+        self.warm_up_s = time.perf_counter() - started
+        self.error = None
+        self.status = "ready"
+        self.ready = True
+        logging.info(f"Chat runtime ready (load {self.load_s:.1f}s, warm-up {self.warm_up_s:.1f}s)")
+
+    def _failed(self, message: str, error: Exception):
+        self.error = f"{type(error).__name__}: {error}"
+        logging.warning(f"{message}, retrying in {runtime_config.Warmup_retry_s:.0f}s: {self.error}")
+
+    def _build(self):
+        # Imported here so auth-only processes never load langchain, chroma or pandas
+        from vector_db import VectorDB
+        from llm_chain import CustomOrgChatChain
+
+        chat_chain = CustomOrgChatChain(VectorDB(self.collection_name, self.persist_directory))
+        if chat_chain.answer_cache:
+            registry.register_collector("answer_cache", chat_chain.answer_cache.stats)
+        if hasattr(chat_chain.vector_db.embeddings, "stats"):
+            registry.register_collector("embedding_cache", chat_chain.vector_db.embeddings.stats)
+        return chat_chain
+
+    def _warm_up(self):
+        from model_router import FAST, FULL
+        from prompt_builder import SYSTEM_PREFIX
+
+        chain = self.chat_chain
+        # Bypass the embedding cache: a cache hit would not load the model
+        embeddings = getattr(chain.vector_db.embeddings, "embeddings", chain.vector_db.embeddings)
+        embeddings.embed_query(runtime_config.Warmup_question)
+
+        # Opens the collections, partitions and lexical index the way a real query does
+        chain._retrieve(runtime_config.Warmup_question, "HR", "All")
+
+        # One token from the shared prompt prefix loads each model and primes its prompt cache
+        chain.llms[FULL].invoke(SYSTEM_PREFIX, options={"num_predict": 1})
+        if chain.router.enabled:
+            try:
+                chain.llms[FAST].invoke(SYSTEM_PREFIX, options={"num_predict": 1})
+            except Exception as e:
+                logging.warning(f"Fast model warm-up failed, routing to the full model for now: {e}")
+                chain.router.fast_tier_failed()
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "status": self.status,
+            "error": self.error,
+            "load_s": round(self.load_s, 2) if self.load_s is not None else None,
+            "warm_up_s": round(self.warm_up_s, 2) if self.warm_up_s is not None else None,
+        }
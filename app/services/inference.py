@@ -0,0 +1,189 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+from app.config import inference_config
+from app.monitoring.metrics import inference_queue_wait_seconds
+
+
+class InferenceQueueFull(Exception):
+    """Raised when every worker is busy and the admission queue is full."""
+
+
+class InferenceTimeout(Exception):
+    """Raised when a request misses its deadline, in the queue or while running."""
+
+
+_END_OF_STREAM = object()
+
+
+class InferencePool:
+    def __init__(self, max_workers: int, max_queue: int, timeout_s: float):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        # admitted = running + waiting for a worker
+        self._admitted = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    def _admit(self):
+        with self._lock:
+            if self._admitted >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise InferenceQueueFull("Inference queue is full")
+            self._admitted += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._admitted -= 1
+
+    def _wrap(self, fn: Callable, deadline: float) -> Callable:
+        # Run in the caller's context so the request's trace follows it onto the worker
+        context = contextvars.copy_context()
+        submitted = time.monotonic()
+
+        def job():
+            started = time.monotonic()
+            inference_queue_wait_seconds.observe(started - submitted)
+            # Skip work whose caller has already given up while it sat in the queue
+            if started >= deadline:
+                raise InferenceTimeout("Deadline expired while queued")
+            with self._lock:
+                self._running += 1
+            try:
+                return context.run(fn)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+        return job
+
+    def submit(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Future:
+        """
+        Admit and queue a blocking callable from any thread; returns its Future.
+        Raises InferenceQueueFull when admission is refused; the job fails with InferenceTimeout
+        if it has not started by its deadline.
+        """
+        self._admit()
+        deadline = time.monotonic() + (timeout or self.timeout_s)
+        try:
+            future = self._executor.submit(self._wrap(functools.partial(fn, *args, **kwargs), deadline))
+        except BaseException:
+            self._release()
+            raise
+        # The slot is freed when the job really finishes, not when the caller stops waiting
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run a blocking callable on the inference workers without blocking the event loop.
+        Raises InferenceQueueFull when admission is refused and InferenceTimeout on deadline.
+        """
+        timeout = timeout or self.timeout_s
+        future = self.submit(fn, *args, timeout=timeout, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timed_out += 1
+            raise InferenceTimeout(f"Inference did not finish within {timeout:.0f}s")
+
+    def stream(self, fn: Callable[..., Iterator], *args, timeout: Optional[float] = None,
+               **kwargs) -> AsyncIterator:
+        """
+        Run a blocking generator on the inference workers and relay its items to the event loop.
+        Admission is checked immediately so callers can reject before starting a response;
+        closing the returned iterator (e.g. client disconnect) stops the generator.
+        """
+        self._admit()
+        timeout = timeout or self.timeout_s
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            generator = fn(*args, **kwargs)
+            try:
+                for item in generator:
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, (item, None))
+            finally:
+                generator.close()
+
+        def finished(future):
+            self._release()
+            error = None if future.cancelled() else future.exception()
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, (_END_OF_STREAM, error))
+            except RuntimeError:
+                pass  # event loop already closed
+
+        try:
+            future = self._executor.submit(self._wrap(produce, deadline))
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(finished)
+        return self._relay(items, future, cancelled, deadline, timeout)
+
+    async def _relay(self, items: asyncio.Queue, future, cancelled: threading.Event,
+                     deadline: float, timeout: float) -> AsyncIterator:
+        try:
+            while True:
+                try:
+                    item, error = await asyncio.wait_for(items.get(), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self._timed_out += 1
+                    raise InferenceTimeout(f"Inference did not finish within {timeout:.0f}s")
+                if item is _END_OF_STREAM:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            cancelled.set()
+            future.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._admitted - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global instances
+inference_pool = InferencePool(
+    max_workers=inference_config.Max_workers,
+    max_queue=inference_config.Max_queue,
+    timeout_s=inference_config.Request_timeout_s,
+)
+# Coordinators of /api/chat/batch requests. They wait on their generations for minutes, so
+# they get their own threads; the generations themselves are admitted to inference_pool.
+batch_pool = InferencePool(
+    max_workers=inference_config.Batch_max_running,
+    max_queue=inference_config.Batch_max_queue,
+    timeout_s=inference_config.Batch_timeout_s,
+)
@@ -0,0 +1,213 @@
+import csv
+import io
+import logging
+import re
+import secrets
+import string
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import provisioning_config
+from app.models.users import User, UserRoleEnum
+from app.security.password import password_manager
+
+HR_DEPARTMENT = "Human Resources"
+# Titles that get department-wide access; the dataset spells "Sr. Manger" that way
+_MANAGER_TITLES = re.compile(r"\b(manager|manger|director|vp|vice president)\b", re.IGNORECASE)
+
+_SPECIAL_CHARS = "!@#$%^&*"
+
+
+def role_for(department: str, job_title: str) -> UserRoleEnum:
+    """
+    HR staff administer everyone; managers, directors and VPs see their department.
+    """
+    if department == HR_DEPARTMENT:
+        return UserRoleEnum.admin
+    if _MANAGER_TITLES.search(job_title):
+        return UserRoleEnum.manager
+    return UserRoleEnum.employee
+
+
+def temporary_password(length: int) -> str:
+    """
+    Random password that satisfies the password policy (upper, lower, digit and special character).
+    """
+    classes = [string.ascii_uppercase, string.ascii_lowercase, string.digits, _SPECIAL_CHARS]
+    alphabet = "".join(classes)
+    chars = [secrets.choice(chars) for chars in classes]
+    chars += [secrets.choice(alphabet) for _ in range(max(length, 8) - len(chars))]
+    secrets.SystemRandom().shuffle(chars)
+    return "".join(chars)
+
+
+def read_employee_rows(data: bytes) -> list[tuple[int, dict]]:
+    """
+    (line number, row) for each record of an employee CSV export.
+    HR exports are usually UTF-8 but spreadsheet tools often save cp1252.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("cp1252")
+    reader = csv.DictReader(io.StringIO(text))
+    # Line 1 is the header
+    return [(line, row) for line, row in enumerate(reader, start=2)]
+
+
+class UserProvisioner:
+    """
+    Creates accounts for a whole employee export: username = EEID, role from department and
+    job title, and a random temporary password. Passwords are hashed in parallel on the
+    password worker processes and users are inserted with one multi-row INSERT per batch,
+    skipping anyone who already exists.
+    """
+
+    def __init__(self, batch_size: int, email_domain: str, password_length: int):
+        self.batch_size = batch_size
+        self.email_domain = email_domain
+        self.password_length = password_length
+
+    def _accounts(self, rows: list[tuple[int, dict]]) -> tuple[list[dict], list[dict]]:
+        """
+        Valid, de-duplicated accounts to create, and per-row errors for the rest.
+        """
+        accounts, errors, seen = [], [], {}
+        for line, row in rows:
+            username = (row.get("EEID") or "").strip()
+            full_name = (row.get("Full Name") or "").strip()
+            department = (row.get("Department") or "").strip()
+            job_title = (row.get("Job Title") or "").strip()
+            error = None
+            if not username:
+                error = "missing EEID"
+            elif not full_name:
+                error = "missing Full Name"
+            elif not department:
+                error = "missing Department"
+            elif username.lower() in seen:
+                error = f"duplicate EEID, first seen on row {seen[username.lower()]}"
+            if error:
+                errors.append({"row": line, "username": username or None, "error": error})
+                continue
+            seen[username.lower()] = line
+            accounts.append({
+                "row": line,
+                "username": username,
+                "email": f"{username.lower()}@{self.email_domain}",
+                "full_name": full_name,
+                "department": department,
+                "role": role_for(department, job_title),
+            })
+        return accounts, errors
+
+    @staticmethod
+    def _insert(db: AsyncSession, values: list[dict]):
+        dialect = db.bind.dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            # Existing usernames are filtered out beforehand; only a concurrent insert can conflict
+            return insert(User).values(values).returning(User.username)
+        # Any unique conflict (username or e-mail) skips the row instead of failing the batch
+        return dialect_insert(User).values(values).on_conflict_do_nothing().returning(User.username)
+
+    async def provision(self, db: AsyncSession, rows: list[tuple[int, dict]]) -> dict:
+        """
+        Create the accounts and return a report with throughput, per-row errors and the
+        temporary credentials of the users created.
+        """
+        started = time.perf_counter()
+        accounts, errors = self._accounts(rows)
+        created, credentials = [], []
+        skipped = 0
+        hash_s = insert_s = 0.0
+
+        for start in range(0, len(accounts), self.batch_size):
+            batch = accounts[start:start + self.batch_size]
+            # Re-runs skip existing users before paying for bcrypt
+            result = await db.execute(select(User.username).where(User.username.in_([a["username"] for a in batch])))
+            existing = set(result.scalars())
+            skipped += len(existing)
+            batch = [account for account in batch if account["username"] not in existing]
+            if not batch:
+                continue
+
+            hash_started = time.perf_counter()
+            passwords = [temporary_password(self.password_length) for _ in batch]
+            hashes = await password_manager.hash_passwords_async(passwords)
+            hash_s += time.perf_counter() - hash_started
+
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            values = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "username": account["username"],
+                    "email": account["email"],
+                    "full_name": account["full_name"],
+                    "hashed_password": password_hash,
+                    "role": account["role"],
+                    "department": account["department"],
+                    "is_active": True,
+                    "created_at": now,
+                    "failed_login_attempts": 0,
+                }
+                for account, password_hash in zip(batch, hashes)
+            ]
+            insert_started = time.perf_counter()
+            try:
+                result = await db.execute(self._insert(db, values))
+                inserted = set(result.scalars())
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logging.error(f"Provisioning batch starting at row {batch[0]['row']} failed: {e}")
+                errors.extend({"row": a["row"], "username": a["username"], "error": f"insert failed: {e}"}
+                              for a in batch)
+                continue
+            finally:
+                insert_s += time.perf_counter() - insert_started
+
+            for account, password in zip(batch, passwords):
+                if account["username"] in inserted:
+                    created.append(account)
+                    credentials.append({"username": account["username"], "temporary_password": password})
+                else:
+                    errors.append({"row": account["row"], "username": account["username"],
+                                   "error": "conflicts with an existing user (username or e-mail)"})
+
+        seconds = time.perf_counter() - started
+        roles = {}
+        for account in created:
+            roles[account["role"].value] = roles.get(account["role"].value, 0) + 1
+        report = {
+            "rows": len(rows),
+            "created": len(created),
+            "skipped_existing": skipped,
+            "failed": len(errors),
+            "roles": roles,
+            "seconds": round(seconds, 2),
+            "hash_seconds": round(hash_s, 2),
+            "insert_seconds": round(insert_s, 2),
+            "users_per_s": round(len(created) / seconds, 1) if seconds else 0.0,
+            "errors": sorted(errors, key=lambda error: error["row"]),
+            "credentials": credentials,
+        }
+        logging.info(f"Provisioned {report['created']} users from {report['rows']} rows "
+                     f"({report['skipped_existing']} existing, {report['failed']} failed) "
+                     f"in {report['seconds']}s, {report['users_per_s']} users/s")
+        return report
+
+
+# Global instance
+user_provisioner = UserProvisioner(
+    batch_size=provisioning_config.Batch_size,
+    email_domain=provisioning_config.Email_domain,
+    password_length=provisioning_config.Temp_password_length,
+)
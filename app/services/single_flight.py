@@ -0,0 +1,158 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable
+
+from app.config import inference_config
+
+
+class _Call:
+    """
+    One shared unit of work and the number of callers still waiting on it.
+    """
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """
+    Events of one shared stream, kept so late subscribers replay from the start.
+    """
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.events = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.pump = None
+
+    def publish(self, event):
+        self.events.append(event)
+        self.changed.set()
+
+    def finish(self, error: BaseException | None = None):
+        self.done = True
+        self.error = error
+        self.changed.set()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests: the first caller for a key starts the work,
+    concurrent callers with the same key attach to it and get the same result or stream.
+    The shared work only stops when every attached caller has gone away.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls = {}
+        self._streams = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await fn() once per key among concurrent callers.
+        """
+        if not self.enabled:
+            return await fn()
+
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(self._calls, key, call))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        call.waiters += 1
+        try:
+            # Shielded: a cancelled caller must not cancel the work the others wait on
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # New callers must not attach to work that is being cancelled
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def stream(self, key: Hashable, start: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """
+        Share one async iterator per key. start() runs synchronously for the first caller,
+        so its admission errors (e.g. InferenceQueueFull) reach that caller directly.
+        A caller only counts as a subscriber once it starts iterating, so one that never reads
+        (e.g. the client disconnected before the response started) cannot keep the work alive.
+        """
+        if not self.enabled:
+            return start()
+
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            source = start()
+            broadcast = _Broadcast(key)
+            self._streams[key] = broadcast
+            broadcast.pump = asyncio.ensure_future(self._pump(key, broadcast, source))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        return self._subscribe(broadcast)
+
+    async def _pump(self, key: Hashable, broadcast: _Broadcast, source: AsyncIterator):
+        try:
+            async for event in source:
+                broadcast.publish(event)
+        except asyncio.CancelledError:
+            broadcast.finish(asyncio.CancelledError())
+        except Exception as e:
+            broadcast.finish(e)
+        else:
+            broadcast.finish()
+        finally:
+            self._forget(self._streams, key, broadcast)
+            await source.aclose()
+
+    async def _subscribe(self, broadcast: _Broadcast) -> AsyncIterator:
+        # Runs on the first read; a generator closed before that never reaches the finally below
+        broadcast.subscribers += 1
+        position = 0
+        try:
+            while True:
+                if position < len(broadcast.events):
+                    event = broadcast.events[position]
+                    position += 1
+                    yield event
+                    continue
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                broadcast.changed.clear()
+                await broadcast.changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            # The last subscriber leaving stops the shared generation
+            if broadcast.subscribers == 0 and not broadcast.done:
+                self._forget(self._streams, broadcast.key, broadcast)
+                broadcast.pump.cancel()
+
+    @staticmethod
+    def _forget(registry: dict, key: Hashable, entry):
+        # Only drop the entry if a newer call has not already replaced it
+        if registry.get(key) is entry:
+            del registry[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+
+# Global instance
+single_flight = SingleFlight(enabled=inference_config.Coalesce_requests)
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+from app.config import llm_config, embedding_cache_config
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by an in-memory LRU and a SQLite store on disk.
+    Vectors are keyed by (model name, sha256 of text) and stored as float32 blobs,
+    so ingestion and query paths share them across processes and restarts. The LRU holds
+    float32 arrays and is bounded by their total size in bytes.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, path: str, memory_bytes: int):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.memory_bytes = memory_bytes
+
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        # sqlite3 connections cannot be shared between threads
+        self._local = threading.local()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_used -= previous.nbytes
+            self._memory[key] = vector
+            self._memory_used += vector.nbytes
+            while self._memory_used > self.memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= evicted.nbytes
+
+    def _lookup(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.memory_hits += len(found)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            conn = self._connection()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(batch))})",
+                    [self.model_name, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+                with self._lock:
+                    self.disk_hits += len(rows)
+        return found
+
+    def _store(self, items: dict[str, np.ndarray]):
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(self.model_name, key, vector.tobytes())
+                 for key, vector in items.items()],
+            )
+        for key, vector in items.items():
+            self._remember(key, vector)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._hash(text) for text in texts]
+        found = self._lookup(keys)
+
+        # Embed each distinct missing text once, in a single call
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            self._store(computed)
+            found.update(computed)
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+def keep_alive_seconds(keep_alive: str) -> int:
+    """
+    "30m" / "1h" / "45s" / "600" -> seconds; the embeddings client only takes an integer.
+    """
+    units = {"s": 1, "m": 60, "h": 3600}
+    keep_alive = keep_alive.strip().lower()
+    if keep_alive and keep_alive[-1] in units:
+        return int(float(keep_alive[:-1]) * units[keep_alive[-1]])
+    return int(keep_alive)
+
+
+def build_embeddings() -> Embeddings:
+    """
+    The embedding client used by both ingestion and queries, cached unless disabled.
+    """
+    embeddings = OllamaEmbeddings(
+        model=llm_config.Embedding_model,
+        base_url=llm_config.Ollama_base_url,
+        keep_alive=keep_alive_seconds(llm_config.Keep_alive),
+    )
+    if not embedding_cache_config.Enabled:
+        return embeddings
+    return CachedEmbeddings(
+        embeddings,
+        model_name=llm_config.Embedding_model,
+        path=embedding_cache_config.Path,
+        memory_bytes=int(embedding_cache_config.Memory_mb * 1024 * 1024),
+    )
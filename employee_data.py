@@ -0,0 +1,25 @@
+# (label in the document text, source column), in the order they appear in the document
+DOCUMENT_FIELDS = [
+    ("EmployeeID", "EEID"),
+    ("Name", "Full Name"),
+    ("Job Title", "Job Title"),
+    ("Department", "Department"),
+    ("Business Unit", "Business Unit"),
+    ("Country", "Country"),
+    ("City", "City"),
+    ("Annual Salary", "Annual Salary"),
+    ("Bonus %", "Bonus %"),
+]
+
+
+def detect_encoding(path: str) -> str:
+    """
+    HR exports are usually UTF-8 but spreadsheet tools often save cp1252; pick whichever decodes.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            while f.read(1 << 20):
+                pass
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
@@ -0,0 +1,172 @@
+import argparse
+import csv
+import itertools
+import logging
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.config import llm_config, vector_store_config
+from employee_data import detect_encoding
+from mmap_index import build_from_chroma, mmap_manifest_path
+from vector_db import VectorDB
+
+# Scopes evaluated for each question; managers and employees are placed in the expected employee's department
+SCOPES = ("HR", "manager", "employee")
+QUESTION_KINDS = ("eeid", "name", "attributes")
+
+COLUMNS = ["embedding_model", "backend", "hybrid", "scope", "k", "questions", "recall", "mrr",
+           "recall_eeid", "recall_name", "recall_attributes", "p50_ms", "p95_ms", "rbac_violations"]
+
+
+def load_employees(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path, encoding=detect_encoding(path))
+    df = df.astype(str).apply(lambda column: column.str.strip())
+    # Later rows win, matching what ingest indexes
+    return df.drop_duplicates(subset="EEID", keep="last").reset_index(drop=True)
+
+
+def generate_questions(df: pd.DataFrame, per_kind: int, seed: int = 0) -> list[dict]:
+    """
+    Questions with the set of EEIDs that answer them: direct id lookups, lookups by full name,
+    and descriptions by job title, department and city (which may match several employees).
+    """
+    rng = random.Random(seed)
+    by_name = df.groupby("Full Name")["EEID"].apply(set).to_dict()
+    by_attributes = df.groupby(["Job Title", "Department", "City"])["EEID"].apply(set).to_dict()
+    rows = df.to_dict("records")
+
+    questions = []
+    for kind in QUESTION_KINDS:
+        for row in rng.sample(rows, min(per_kind, len(rows))):
+            if kind == "eeid":
+                text, expected = f"Tell me about employee {row['EEID']}", {row["EEID"]}
+            elif kind == "name":
+                text, expected = f"What is the job title of {row['Full Name']}?", by_name[row["Full Name"]]
+            else:
+                text = f"Who is the {row['Job Title']} in {row['Department']} based in {row['City']}?"
+                expected = by_attributes[(row["Job Title"], row["Department"], row["City"])]
+            questions.append({"kind": kind, "question": text, "expected": expected,
+                              "department": row["Department"]})
+    return questions
+
+
+def evaluate(db: VectorDB, questions: list[dict], scope: str, k: int) -> dict:
+    """
+    recall@k (share of the expected employees, up to k, found in the top k), MRR and latency
+    for one scope and k under the current vector_store_config.
+    """
+    recalls = {kind: [] for kind in QUESTION_KINDS}
+    reciprocal_ranks, latencies = [], []
+    violations = 0
+    retrievers = {}
+    for question in questions:
+        department = question["department"]
+        retriever = retrievers.get(department)
+        if retriever is None:
+            retriever = retrievers[department] = db.get_retriever(scope, department, top_k=k)
+
+        started = time.perf_counter()
+        docs = retriever.invoke(question["question"])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        ids = [doc.metadata.get("employee_id") for doc in docs]
+        if scope != "HR":
+            violations += sum(doc.metadata.get("department") != department for doc in docs)
+        expected = question["expected"]
+        recalls[question["kind"]].append(len(expected.intersection(ids[:k])) / min(len(expected), k))
+        rank = next((i for i, doc_id in enumerate(ids, start=1) if doc_id in expected), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    all_recalls = [value for values in recalls.values() for value in values]
+    result = {
+        "questions": len(questions),
+        "recall": round(float(np.mean(all_recalls)), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "rbac_violations": violations,
+    }
+    for kind, values in recalls.items():
+        result[f"recall_{kind}"] = round(float(np.mean(values)), 4) if values else None
+    return result
+
+
+def run(path: str, collection_name: str, persist_directory: str, ks: list[int], scopes: list[str],
+        backends: list[str], hybrid_modes: list[str], per_kind: int, seed: int = 0) -> list[dict]:
+    """
+    Evaluate every combination of backend, hybrid mode, scope and k. Question embeddings are
+    computed once up front so every configuration measures retrieval, not the embedding model;
+    that cost is logged separately. To compare embedding models, ingest each into its own
+    persist directory and run this with EMBEDDING_MODEL set accordingly.
+    """
+    questions = generate_questions(load_employees(path), per_kind, seed)
+    db = VectorDB(collection_name, persist_directory)
+
+    started = time.perf_counter()
+    db.embeddings.embed_documents([question["question"] for question in questions])
+    logging.info(f"Embedded {len(questions)} questions with {llm_config.Embedding_model} "
+                 f"in {time.perf_counter() - started:.2f}s")
+
+    if "mmap" in backends and not os.path.exists(mmap_manifest_path(persist_directory, db.active_collection)):
+        logging.info("Building the memory-mapped index for the mmap backend")
+        build_from_chroma(persist_directory, db.active_collection, dtype=vector_store_config.Mmap_dtype)
+
+    saved = vector_store_config.Backend, vector_store_config.Hybrid
+    results = []
+    try:
+        for backend, hybrid, scope, k in itertools.product(backends, hybrid_modes, scopes, ks):
+            vector_store_config.Backend, vector_store_config.Hybrid = backend, hybrid
+            result = {"embedding_model": llm_config.Embedding_model, "backend": backend, "hybrid": hybrid,
+                      "scope": scope, "k": k, **evaluate(db, questions, scope, k)}
+            logging.info(f"{backend} hybrid={hybrid} {scope} k={k}: recall {result['recall']}, "
+                         f"MRR {result['mrr']}, p95 {result['p95_ms']}ms")
+            results.append(result)
+    finally:
+        vector_store_config.Backend, vector_store_config.Hybrid = saved
+    return results
+
+
+def to_markdown(results: list[dict]) -> str:
+    lines = ["| " + " | ".join(COLUMNS) + " |", "|" + "---|" * len(COLUMNS)]
+    for result in results:
+        lines.append("| " + " | ".join(str(result[column]) for column in COLUMNS) + " |")
+    return "\n".join(lines)
+
+
+def write_csv(path: str, results: list[dict]):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Measure retrieval recall, MRR and latency per configuration")
+    parser.add_argument("path", nargs="?", default="app/database/Employee Sample Data.csv")
+    parser.add_argument("--collection", default="org_employees")
+    parser.add_argument("--persist-dir", default="./chroma_persist")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--scopes", nargs="+", choices=SCOPES, default=list(SCOPES))
+    parser.add_argument("--backends", nargs="+", choices=["chroma", "mmap"], default=["chroma"])
+    parser.add_argument("--hybrid", nargs="+", choices=["auto", "false"], default=["auto", "false"],
+                        help="auto uses the lexical index when ingest wrote one")
+    parser.add_argument("--questions-per-kind", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--markdown", help="Also write the table to this file")
+    parser.add_argument("--csv", help="Also write the results to this CSV file")
+    args = parser.parse_args()
+
+    results = run(args.path, args.collection, args.persist_dir, args.k, args.scopes, args.backends,
+                  args.hybrid, args.questions_per_kind, args.seed)
+    table = to_markdown(results)
+    print(table)
+    if args.markdown:
+        with open(args.markdown, "w") as f:
+            f.write(table + "\n")
+    if args.csv:
+        write_csv(args.csv, results)
@@ -1,45 +1,573 @@
-import pandas as pd
+import argparse
+import hashlib
 import json
-from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings  
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from typing import Optional
+
+import chromadb
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+
+from app.config import ingest_config, vector_store_config
+from embedding_cache import build_embeddings
+from employee_data import DOCUMENT_FIELDS, detect_encoding
+from lexical_index import LexicalIndex, lexical_index_path
+from mmap_index import build_from_chroma, mmap_manifest_path
+from vector_db import (
+    partition_collection_name,
+    partition_index_path,
+    read_active_collection,
+    read_partition_index,
+    versioned_collection_name,
+    write_active_collection,
+    write_ingest_marker,
+    write_partition_index,
+)
+
 
-def load_and_ingest(path: str, collection_name: str, persist_directory: str):
+def read_chunks(path: str, chunk_size: int):
+    """
+    Yield the source file as DataFrames of at most `chunk_size` rows.
+    """
     if path.endswith('.csv'):
-        df = pd.read_csv(path)
+        yield from pd.read_csv(path, chunksize=chunk_size, encoding=detect_encoding(path))
     elif path.endswith('.json'):
-        df = pd.read_json(path)
+        with open(path) as f:
+            is_array = f.read(1024).lstrip().startswith('[')
+        if is_array:
+            # A JSON array cannot be streamed by pandas; slice it after loading
+            df = pd.read_json(path)
+            for start in range(0, len(df), chunk_size):
+                yield df.iloc[start:start + chunk_size]
+        else:
+            yield from pd.read_json(path, lines=True, chunksize=chunk_size)
     else:
         raise ValueError("Unsupported file format. Provide .csv or .json")
 
-    texts, metadatas = [], []
-    for _, row in df.iterrows():
-        doc_text = (
-            f"EmployeeID: {row['EEID']}\n"
-            f"Name: {row['Full Name']}\n"
-            f"Job Title: {row['Job Title']}\n"
-            f"Department: {row['Department']}\n"
-            f"Business Unit: {row['Business Unit']}\n"
-            f"Country: {row['Country']}\n"
-            f"City: {row['City']}\n"
-            f"Annual Salary: {row['Annual Salary']}\n"
-            f"Bonus %: {row['Bonus %']}"
-        )
-        texts.append(doc_text)
-        metadatas.append({
-            "employee_id": row['EEID'],
-            "department": row['Department'],
-            "role": "employee"
-        })
-
-    embeddings = OllamaEmbeddings(model="mxbai-embed-large")
-    vector_db = Chroma.from_texts(
-        texts=texts,
-        embedding=embeddings,
-        metadatas=metadatas,
-        collection_name=collection_name,
-        persist_directory=persist_directory
+
+def build_documents(df: pd.DataFrame):
+    """
+    Build document texts, metadatas and ids for a chunk with column-wise string operations.
+    """
+    # Later rows win, matching upsert semantics
+    df = df.drop_duplicates(subset="EEID", keep="last")
+    lines = [f"{label}: " + df[column].astype(str) for label, column in DOCUMENT_FIELDS]
+    texts = reduce(lambda left, right: left + "\n" + right, lines)
+
+    metadatas = (
+        df[["EEID", "Department"]]
+        .astype(str)
+        .rename(columns={"EEID": "employee_id", "Department": "department"})
+        .assign(role="employee", content_hash=texts.map(content_hash).values)
+        .to_dict("records")
     )
-    vector_db.persist()
+    ids = df["EEID"].astype(str).tolist()
+    return texts.tolist(), metadatas, ids
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fetch_existing_metadata(collection, page_size: int = 5000) -> dict[str, dict]:
+    """
+    Map every id already in the collection to its metadata (content hash, department, ...).
+    """
+    existing = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            existing[doc_id] = metadata or {}
+        if len(page["ids"]) < page_size:
+            return existing
+        offset += page_size
+
+
+def lexical_from_collection(collection, page_size: int = 5000) -> LexicalIndex:
+    """
+    Rebuild the lexical index from the documents already in a collection.
+    """
+    lexical = LexicalIndex()
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        lexical.add(page["ids"], page["documents"], [metadata or {} for metadata in page["metadatas"]])
+        if len(page["ids"]) < page_size:
+            return lexical
+        offset += page_size
+
+
+class PartitionWriter:
+    """
+    Mirrors writes to the main collection into one collection per department,
+    moving documents between partitions when an employee changes department.
+    """
+
+    def __init__(self, client, persist_directory: str, collection_name: str, departments: dict[str, str]):
+        self.client = client
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        # id -> department currently holding it
+        self.departments = departments
+        self.index = read_partition_index(persist_directory, collection_name) or {}
+        self._collections = {}
+
+    def _collection(self, department: str):
+        if department not in self.index:
+            self.index[department] = partition_collection_name(self.collection_name, department)
+            # Publish new partitions right away so readers can find them
+            write_partition_index(self.persist_directory, self.collection_name, self.index)
+        name = self.index[department]
+        if name not in self._collections:
+            self._collections[name] = self.client.get_or_create_collection(name, embedding_function=None)
+        return self._collections[name]
+
+    def _group(self, ids: list[str], departments: list[str]) -> dict[str, list[int]]:
+        groups = {}
+        for i, department in enumerate(departments):
+            groups.setdefault(department, []).append(i)
+        return groups
+
+    def upsert(self, ids: list[str], vectors: list, texts: list[str], metadatas: list[dict]):
+        new_departments = [metadata["department"] for metadata in metadatas]
+        moved = [(doc_id, self.departments[doc_id]) for doc_id, department in zip(ids, new_departments)
+                 if self.departments.get(doc_id) not in (None, department)]
+        if moved:
+            self.delete([doc_id for doc_id, _ in moved])
+
+        for department, rows in self._group(ids, new_departments).items():
+            self._collection(department).upsert(
+                ids=[ids[i] for i in rows],
+                embeddings=[vectors[i] for i in rows],
+                documents=[texts[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+            )
+        self.departments.update(zip(ids, new_departments))
+
+    def delete(self, ids: list[str]):
+        known = [doc_id for doc_id in ids if doc_id in self.departments]
+        for department, rows in self._group(known, [self.departments[doc_id] for doc_id in known]).items():
+            self._collection(department).delete(ids=[known[i] for i in rows])
+        for doc_id in known:
+            del self.departments[doc_id]
+
+
+def embed_in_batches(embeddings: Embeddings, texts: list[str], batch_size: int,
+                     executor: ThreadPoolExecutor) -> list[list[float]]:
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    # map() keeps batch order, so vectors line up with texts
+    return [vector for batch in executor.map(embeddings.embed_documents, batches) for vector in batch]
+
+
+def _checkpoint_path(persist_directory: str, collection_name: str) -> str:
+    return os.path.join(persist_directory, f"{collection_name}.ingest_checkpoint.json")
+
+
+def _source_signature(path: str) -> dict:
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _load_checkpoint(checkpoint_path: str, signature: dict) -> dict:
+    """
+    Progress of an interrupted ingest of this exact source file: rows already ingested and
+    the collection version being built. Empty if there is no usable checkpoint.
+    """
+    try:
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if any(checkpoint.get(key) != value for key, value in signature.items()):
+        return {}
+    return {"rows_done": int(checkpoint.get("rows_done", 0)), "collection": checkpoint.get("collection")}
+
+
+def _save_checkpoint(checkpoint_path: str, signature: dict, rows_done: int, collection: str):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({**signature, "rows_done": rows_done, "collection": collection}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def _collection_versions(client, collection_name: str) -> list[str]:
+    """
+    Blue/green versions of a collection in the store, oldest first.
+    """
+    pattern = re.compile(re.escape(collection_name) + r"\.v(\d+)$")
+    names = [collection.name for collection in client.list_collections()]
+    return sorted((name for name in names if pattern.match(name)), key=lambda name: int(pattern.match(name).group(1)))
+
+
+def seed_collection(client, source_name: str, collection, partitions, lexical: LexicalIndex,
+                    page_size: int = 5000) -> int:
+    """
+    Copy every document and embedding of `source_name` into a new version, so an incremental
+    ingest only has to embed what changed. Returns the number of documents copied.
+    """
+    try:
+        source = client.get_collection(source_name)
+    except Exception:
+        return 0
+    copied = 0
+    while True:
+        page = source.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=copied)
+        if not page["ids"]:
+            return copied
+        ids, texts = page["ids"], page["documents"]
+        vectors = [list(vector) for vector in page["embeddings"]]
+        metadatas = [metadata or {} for metadata in page["metadatas"]]
+        collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        if partitions:
+            partitions.upsert(ids, vectors, texts, metadatas)
+        lexical.add(ids, texts, metadatas)
+        copied += len(ids)
+
+
+def export_changes(path: str, chunk_size: int, existing_hashes: dict[str, str]) -> dict:
+    """
+    Count the new, changed, unchanged and deleted rows of an export against the content
+    hashes already indexed, without embedding or writing anything.
+    """
+    counts = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+    seen_ids = set()
+    rows = 0
+    for chunk in read_chunks(path, chunk_size):
+        rows += len(chunk)
+        _, metadatas, ids = build_documents(chunk)
+        seen_ids.update(ids)
+        for doc_id, metadata in zip(ids, metadatas):
+            known = existing_hashes.get(doc_id)
+            if known is None:
+                counts["new"] += 1
+            elif known != metadata["content_hash"]:
+                counts["changed"] += 1
+            else:
+                counts["unchanged"] += 1
+    counts["deleted"] = sum(doc_id not in seen_ids for doc_id in existing_hashes)
+    return {"rows_total": rows, **counts}
+
+
+def validate_collection(client, persist_directory: str, collection_name: str, expected_count: int) -> dict:
+    """
+    Check a freshly built version before it is published: the collection holds the expected
+    documents, its partitions and lexical index agree with it, and a stored vector finds itself.
+    Raises ValueError describing the first problem found.
+    """
+    collection = client.get_collection(collection_name)
+    count = collection.count()
+    if count == 0 or count != expected_count:
+        raise ValueError(f"{collection_name} holds {count} documents, expected {expected_count}")
+
+    partition_index = read_partition_index(persist_directory, collection_name)
+    if partition_index:
+        partitioned = sum(client.get_collection(name).count() for name in set(partition_index.values()))
+        if partitioned != count:
+            raise ValueError(f"{collection_name} partitions hold {partitioned} documents, expected {count}")
+
+    lexical = LexicalIndex.load(lexical_index_path(persist_directory, collection_name))
+    if lexical is None or len(lexical) != count:
+        raise ValueError(f"{collection_name} lexical index has {len(lexical) if lexical else 0} "
+                         f"documents, expected {count}")
+
+    sample = collection.get(limit=1, include=["embeddings"])
+    hits = collection.query(query_embeddings=[list(sample["embeddings"][0])], n_results=1, include=["distances"])
+    if not hits["ids"][0] or hits["distances"][0][0] > 1e-3:
+        raise ValueError(f"{collection_name} search did not return a stored document for its own vector")
+    return {"documents": count, "partitions": len(set(partition_index.values())) if partition_index else 0}
+
+
+def remove_orphan_segments(persist_directory: str) -> list[str]:
+    """
+    Chroma's delete_collection leaves the collection's HNSW segment directory on disk. Remove
+    every segment directory that no segment in the store's catalog refers to anymore.
+    """
+    db_path = os.path.join(persist_directory, "chroma.sqlite3")
+    try:
+        with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)) as db:
+            live = {row[0] for row in db.execute("SELECT id FROM segments")}
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read Chroma's segment catalog, leaving segment files in place: {e}")
+        return []
+    removed = []
+    for name in os.listdir(persist_directory):
+        path = os.path.join(persist_directory, name)
+        if name in live or not os.path.isdir(path):
+            continue
+        try:
+            uuid.UUID(name)
+        except ValueError:
+            continue  # not a segment directory
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(name)
+    return removed
+
+
+def drop_collection_version(client, persist_directory: str, collection_name: str):
+    """
+    Delete a collection version with its partitions, lexical index, mmap index and segment files.
+    """
+    names = set((read_partition_index(persist_directory, collection_name) or {}).values()) | {collection_name}
+    for name in names:
+        try:
+            client.delete_collection(name)
+        except Exception:
+            pass  # already gone
+    paths = [
+        partition_index_path(persist_directory, collection_name),
+        lexical_index_path(persist_directory, collection_name),
+        mmap_manifest_path(persist_directory, collection_name),
+    ]
+    mmap_prefix = f"{collection_name}.mmap."
+    paths += [os.path.join(persist_directory, name) for name in os.listdir(persist_directory)
+              if name.startswith(mmap_prefix)]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    remove_orphan_segments(persist_directory)
+
+
+def remove_old_versions(client, persist_directory: str, collection_name: str, keep: int) -> list[str]:
+    """
+    Garbage-collect versions older than the published one, keeping the newest `keep` versions
+    including the published one. A collection written in place before blue/green ingests counts
+    as the oldest version. Newer versions may still be building and are never touched.
+    """
+    active = read_active_collection(persist_directory, collection_name)
+    if active is None:
+        return []
+    versions = _collection_versions(client, collection_name)
+    older = versions[:versions.index(active)] if active in versions else []
+    if collection_name in {collection.name for collection in client.list_collections()}:
+        older.insert(0, collection_name)
+    removed = older[:max(len(older) - (max(keep, 1) - 1), 0)]
+    for name in removed:
+        drop_collection_version(client, persist_directory, name)
+        logging.info(f"Removed old collection version {name}")
+    return removed
+
+
+def load_and_ingest(path: str, collection_name: str, persist_directory: str,
+                    chunk_size: int = ingest_config.Chunk_size,
+                    batch_size: int = ingest_config.Embed_batch_size,
+                    workers: int = ingest_config.Embed_workers,
+                    resume: bool = True,
+                    incremental: bool = False,
+                    partition: bool = ingest_config.Partition_by_department,
+                    blue_green: Optional[bool] = None) -> dict:
+    """
+    Stream `path` into the collection: read in chunks, embed in parallel batches and upsert
+    by employee id. Progress is checkpointed after every chunk so an interrupted run resumes.
+    With `incremental`, only rows whose content hash changed are embedded, and ids missing
+    from the export are deleted. With `partition`, every write is mirrored into a per-department
+    collection used for partitioned retrieval. With `blue_green`, everything is written to a new
+    collection version that is validated and then published atomically, so readers never see
+    a half-written index; older versions are garbage-collected. It defaults to INGEST_BLUE_GREEN
+    for full runs and INGEST_INCREMENTAL_BLUE_GREEN for incremental ones, which otherwise update
+    the published version in place. An incremental blue/green run that finds nothing to change
+    keeps the published version. Returns throughput stats.
+    """
+    if blue_green is None:
+        blue_green = ingest_config.Incremental_blue_green if incremental else ingest_config.Blue_green
+    os.makedirs(persist_directory, exist_ok=True)
+    checkpoint_path = _checkpoint_path(persist_directory, collection_name)
+    signature = _source_signature(path)
+    checkpoint = _load_checkpoint(checkpoint_path, signature) if resume else {}
+    active = read_active_collection(persist_directory, collection_name)
+    client = chromadb.PersistentClient(path=persist_directory)
+
+    if blue_green and incremental and not checkpoint:
+        # Copying the published version costs time in proportion to headcount; only pay it for real changes
+        started = time.perf_counter()
+        try:
+            published = client.get_collection(active or collection_name)
+        except Exception:
+            published = None
+        if published is not None:
+            existing = fetch_existing_metadata(published)
+            counts = export_changes(path, chunk_size, {doc_id: metadata.get("content_hash")
+                                                       for doc_id, metadata in existing.items()})
+            if not (counts["new"] or counts["changed"] or counts["deleted"]):
+                elapsed = time.perf_counter() - started
+                stats = {"collection": published.name, "rows_ingested": 0, "seconds": round(elapsed, 2),
+                         "rows_per_sec": 0.0, **counts, "removed_versions": []}
+                logging.info(f"Nothing changed since {published.name} was published; keeping it: {stats}")
+                return stats
+
+    if blue_green:
+        # Resume the version an interrupted run was building, unless it has been published since
+        target = checkpoint.get("collection")
+        if not target or target == active or not target.startswith(f"{collection_name}.v"):
+            target, checkpoint = versioned_collection_name(collection_name), {}
+    else:
+        # In place, into whatever readers are currently served
+        target = active or collection_name
+        if checkpoint.get("collection") not in (None, target):
+            # Progress of an unpublished blue/green build says nothing about this collection
+            checkpoint = {}
+    rows_done = checkpoint.get("rows_done", 0)
+    if rows_done:
+        logging.info(f"Resuming ingest of {path} into {target} after {rows_done} rows")
+
+    embeddings = build_embeddings()
+    collection = client.get_or_create_collection(target, embedding_function=None)
+
+    partitions = None
+    if partition:
+        partitions = PartitionWriter(client, persist_directory, target, {})
+    # BM25 / exact-id index served next to the vector store. It is written once at the end;
+    # a resumed run rebuilds it from what the collection already holds.
+    lexical_path = lexical_index_path(persist_directory, target)
+    if rows_done:
+        lexical = lexical_from_collection(collection)
+    else:
+        lexical = LexicalIndex.load(lexical_path) or LexicalIndex()
+    if blue_green and incremental and not rows_done:
+        # Start from the published data so only changed rows are embedded
+        copied = seed_collection(client, active or collection_name, collection, partitions, lexical)
+        logging.info(f"Seeded {target} with {copied} documents from {active or collection_name}")
+    _save_checkpoint(checkpoint_path, signature, rows_done, target)
+
+    existing = fetch_existing_metadata(collection) if incremental or partition else {}
+    existing_hashes = {doc_id: metadata.get("content_hash") for doc_id, metadata in existing.items()}
+    if partitions:
+        partitions.departments = {doc_id: metadata.get("department") for doc_id, metadata in existing.items()}
+    seen_ids = set()
+    counts = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+
+    to_skip = rows_done
+    rows_ingested = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as executor:
+        for chunk in read_chunks(path, chunk_size):
+            chunk_rows = len(chunk)
+            # Rows skipped on resume still count as present in the export
+            seen_ids.update(chunk["EEID"].astype(str).iloc[:to_skip])
+            if to_skip >= chunk_rows:
+                to_skip -= chunk_rows
+                continue
+            chunk = chunk.iloc[to_skip:]
+            to_skip = 0
+
+            texts, metadatas, ids = build_documents(chunk)
+            seen_ids.update(ids)
+            if incremental:
+                changed = [i for i, (doc_id, metadata) in enumerate(zip(ids, metadatas))
+                           if existing_hashes.get(doc_id) != metadata["content_hash"]]
+                for i in changed:
+                    counts["changed" if ids[i] in existing_hashes else "new"] += 1
+                counts["unchanged"] += len(ids) - len(changed)
+                texts = [texts[i] for i in changed]
+                metadatas = [metadatas[i] for i in changed]
+                ids = [ids[i] for i in changed]
+
+            if ids:
+                vectors = embed_in_batches(embeddings, texts, batch_size, executor)
+                collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+                if partitions:
+                    partitions.upsert(ids, vectors, texts, metadatas)
+                lexical.add(ids, texts, metadatas)
+
+            rows_done += len(chunk)
+            rows_ingested += len(chunk)
+            _save_checkpoint(checkpoint_path, signature, rows_done, target)
+            elapsed = time.perf_counter() - started
+            logging.info(f"Ingested {rows_done} rows ({rows_ingested / elapsed:.1f} rows/sec)")
+
+    if incremental:
+        # Employees no longer in the export are removed from the index
+        removed = [doc_id for doc_id in existing_hashes if doc_id not in seen_ids]
+        for start in range(0, len(removed), 5000):
+            collection.delete(ids=removed[start:start + 5000])
+            if partitions:
+                partitions.delete(removed[start:start + 5000])
+        lexical.remove(removed)
+        counts["deleted"] = len(removed)
+    lexical.save(lexical_path)
+
+    if blue_green:
+        try:
+            validation = validate_collection(client, persist_directory, target, len(seen_ids))
+        except ValueError:
+            # Never publish a bad version; the next run starts a fresh one
+            drop_collection_version(client, persist_directory, target)
+            os.remove(checkpoint_path)
+            raise
+
+    # An incremental run that found nothing to apply leaves the served index as it was; a resumed
+    # one may have applied its changes before the interruption
+    modified = not incremental or bool(checkpoint) or bool(counts["new"] or counts["changed"] or counts["deleted"])
+
+    if vector_store_config.Backend == "mmap" and modified:
+        # Built before publishing, so readers switch to a version whose mmap index is ready
+        build_from_chroma(persist_directory, target, dtype=vector_store_config.Mmap_dtype)
+
+    if blue_green:
+        write_active_collection(persist_directory, collection_name, target, **validation)
+        logging.info(f"Published {target} as {collection_name}")
+
+    elapsed = time.perf_counter() - started
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    if modified:
+        # Tells running servers to drop answers cached against the previous data
+        write_ingest_marker(persist_directory)
+
+    stats = {
+        "collection": target,
+        "rows_total": rows_done,
+        "rows_ingested": rows_ingested,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows_ingested / elapsed, 1) if elapsed else 0.0,
+    }
+    if incremental:
+        stats.update(counts)
+    if blue_green:
+        stats["removed_versions"] = remove_old_versions(client, persist_directory, collection_name,
+                                                        keep=ingest_config.Keep_versions)
+    logging.info(f"Ingest finished: {stats}")
+    return stats
 
 if __name__ == "__main__":
-    load_and_ingest("Employee Sample Data.csv", "org_employees", "./chroma_persist")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Ingest employee data into the vector store")
+    parser.add_argument("path", nargs="?", default="app/database/Employee Sample Data.csv")
+    parser.add_argument("--collection", default="org_employees")
+    parser.add_argument("--persist-dir", default="./chroma_persist")
+    parser.add_argument("--chunk-size", type=int, default=ingest_config.Chunk_size)
+    parser.add_argument("--batch-size", type=int, default=ingest_config.Embed_batch_size)
+    parser.add_argument("--workers", type=int, default=ingest_config.Embed_workers)
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any checkpoint and start over")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed new or changed rows and delete rows missing from the export")
+    parser.add_argument("--no-partition", action="store_true",
+                        help="Skip writing per-department partition collections")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--in-place", action="store_true",
+                      help="Write into the served collection instead of building and publishing a new version")
+    mode.add_argument("--blue-green", action="store_true",
+                      help="Build and publish a new version, also for incremental runs")
+    args = parser.parse_args()
+
+    print(load_and_ingest(
+        args.path, args.collection, args.persist_dir,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        resume=not args.no_resume,
+        incremental=args.incremental,
+        partition=ingest_config.Partition_by_department and not args.no_partition,
+        blue_green=False if args.in_place else True if args.blue_green else None,
+    ))
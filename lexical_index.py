@@ -0,0 +1,161 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_EEID = re.compile(r"\bE\d{5}\b", re.IGNORECASE)
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def lexical_index_path(persist_directory: str, collection_name: str) -> str:
+    return os.path.join(persist_directory, f"{collection_name}.lexical.json")
+
+
+def matches_filter(metadata: dict, filter_meta: dict) -> bool:
+    return all(metadata.get(key) == value for key, value in filter_meta.items())
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over the employee documents, plus exact lookup tables
+    for employee ids and full names. Only the documents are persisted; postings are
+    rebuilt on load.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # doc id -> (text, metadata)
+        self.docs = {}
+        # token -> {doc id: term frequency}
+        self.postings = {}
+        self.lengths = {}
+        self.total_length = 0
+        # lowercase full name -> doc ids
+        self.names = {}
+        # department -> number of documents
+        self.departments = Counter()
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @staticmethod
+    def _name(text: str) -> Optional[str]:
+        match = re.search(r"^Name: (.+)$", text, re.MULTILINE)
+        return " ".join(tokenize(match.group(1))) if match else None
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict]):
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            if doc_id in self.docs:
+                self.remove([doc_id])
+            tokens = tokenize(text)
+            self.docs[doc_id] = (text, metadata)
+            self.lengths[doc_id] = len(tokens)
+            self.total_length += len(tokens)
+            for token, tf in Counter(tokens).items():
+                self.postings.setdefault(token, {})[doc_id] = tf
+            name = self._name(text)
+            if name:
+                self.names.setdefault(name, set()).add(doc_id)
+            if metadata.get("department"):
+                self.departments[metadata["department"]] += 1
+
+    def remove(self, ids: list[str]):
+        for doc_id in ids:
+            entry = self.docs.pop(doc_id, None)
+            if entry is None:
+                continue
+            text, metadata = entry
+            self.total_length -= self.lengths.pop(doc_id)
+            for token in set(tokenize(text)):
+                postings = self.postings.get(token)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[token]
+            name = self._name(text)
+            if name and name in self.names:
+                self.names[name].discard(doc_id)
+                if not self.names[name]:
+                    del self.names[name]
+            if metadata.get("department"):
+                self.departments[metadata["department"]] -= 1
+                if self.departments[metadata["department"]] <= 0:
+                    del self.departments[metadata["department"]]
+
+    def exact_matches(self, query: str, filter_meta: dict) -> list[str]:
+        """
+        Doc ids named exactly in the query, by employee id or full name, within the filter.
+        """
+        found = [m.group(0).upper() for m in _EEID.finditer(query)]
+        tokens = tokenize(query)
+        # Names are two to four tokens; check every span of that length
+        for size in (4, 3, 2):
+            for start in range(len(tokens) - size + 1):
+                found.extend(sorted(self.names.get(" ".join(tokens[start:start + size]), ())))
+        seen = set()
+        return [doc_id for doc_id in found
+                if doc_id in self.docs and not (doc_id in seen or seen.add(doc_id))
+                and matches_filter(self.docs[doc_id][1], filter_meta)]
+
+    def search(self, query: str, filter_meta: dict, k: int) -> list[tuple[str, float]]:
+        """
+        BM25 top-k (doc id, score) within the filter.
+        """
+        n = len(self.docs)
+        if not n:
+            return []
+        avg_length = self.total_length / n
+        scores = {}
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_id, score in ranked:
+            if matches_filter(self.docs[doc_id][1], filter_meta):
+                results.append((doc_id, score))
+                if len(results) == k:
+                    break
+        return results
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": 1, "docs": {doc_id: [text, metadata] for doc_id, (text, metadata)
+                                              in self.docs.items()}}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        index = cls()
+        docs = data.get("docs", {})
+        index.add(list(docs), [text for text, _ in docs.values()], [metadata for _, metadata in docs.values()])
+        return index
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """
+    Merge ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
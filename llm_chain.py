@@ -1,54 +1,348 @@
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM  
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import httpx
+from langchain_ollama import OllamaLLM
+
+from app.config import llm_config, inference_config, answer_cache_config, structured_query_config
+from app.services.inference import InferenceQueueFull, inference_pool
+from app.monitoring.metrics import (
+    answers_total, completion_tokens, estimate_tokens, generation_seconds, prompt_documents_dropped, prompt_tokens,
+    retrieved_documents, routing_decisions_total, stage_timer,
+)
+from answer_cache import AnswerCache, normalize_question, normalize_vector, question_entities
+from structured_query import StructuredQueryEngine
+from vector_db import normalize_role, rbac_scope
+from model_router import FAST, FULL, model_router
+from prompt_builder import prompt_builder
 
 class CustomOrgChatChain:
-    def __init__(self, vector_db):
+    def __init__(self, vector_db, max_chains: int = llm_config.Chain_cache_size,
+                 answer_cache: AnswerCache | None = None,
+                 structured_engine: StructuredQueryEngine | None = None):
         self.vector_db = vector_db
+        self.max_chains = max_chains
+
+        # Aggregate and lookup questions are answered from the dataset without the LLM
+        if structured_engine is None and structured_query_config.Enabled:
+            if os.path.exists(structured_query_config.Dataset_path):
+                structured_engine = StructuredQueryEngine.from_file(structured_query_config.Dataset_path)
+            else:
+                logging.warning(f"Structured queries disabled: {structured_query_config.Dataset_path} not found")
+        self.structured_engine = structured_engine
+
+        if answer_cache is None and answer_cache_config.Enabled:
+            answer_cache = AnswerCache(
+                embed_fn=vector_db.embeddings.embed_query if answer_cache_config.Semantic_enabled else None,
+                max_entries=answer_cache_config.Max_entries,
+                ttl_s=answer_cache_config.Ttl_s,
+                similarity_threshold=answer_cache_config.Semantic_threshold,
+                persist_directory=vector_db.persist_directory,
+                ingest_check_interval_s=answer_cache_config.Ingest_check_interval_s,
+                # Employee names and departments come from the lexical index written by ingest
+                entity_fn=lambda question: question_entities(question, vector_db.lexical_index()),
+            )
+        self.answer_cache = answer_cache
 
-        # Custom chatbot persona template
-        template = """
-You are an **AI-Powered Offline Organizational Chatbot**.  
-Background:  
-Organisations generate and store vast amounts of employee information across HR, administration, and employee portals. Traditional systems require manual navigation through multiple apps. You simplify this by letting employees, managers, and HR query data conversationally.  
-
-⚠️ Key Rules:  
-- Ensure **data security**.  
-- Apply **role-based access control (RBAC)**:  
-  - HR: Can access all employee data.  
-  - Managers: Can only access their department’s data.  
-  - Employees: Can only access their own data.  
-- Never invent or expose data you don’t have access to.  
-- Always run **offline** without using external services.  
-
-Question: {question}  
-Role: {role}  
-Department: {department}  
-
-Answer concisely, securely, and based only on retrieved information.
-"""
-        self.prompt = PromptTemplate(
-            input_variables=["question", "role", "department"],
-            template=template
+        # One LLM client per model tier, shared by every request so they reuse its HTTP connections
+        self.router = model_router
+        self.llms = {
+            FULL: self._build_llm(llm_config.Chat_model),
+            FAST: self._build_llm(llm_config.Fast_model),
+        }
+        self.llm = self.llms[FULL]
+
+        # Retrievers keyed by RBAC scope, least recently used first
+        self._retrievers = OrderedDict()
+        self._retrievers_lock = threading.Lock()
+        self.prompt_builder = prompt_builder
+
+    @staticmethod
+    def _build_llm(model: str) -> OllamaLLM:
+        return OllamaLLM(
+            model=model,
+            base_url=llm_config.Ollama_base_url,
+            keep_alive=llm_config.Keep_alive,
+            client_kwargs={
+                "limits": httpx.Limits(
+                    max_connections=inference_config.Max_workers * 2,
+                    max_keepalive_connections=inference_config.Max_workers * 2,
+                ),
+            },
         )
 
+    def _get_retriever(self, user_role: str, user_department: str):
+        """
+        Return the RBAC-filtered retriever for this user's scope, building it on first use.
+        """
+        scope = rbac_scope(user_role, user_department)
+        with self._retrievers_lock:
+            retriever = self._retrievers.get(scope)
+            if retriever is not None:
+                self._retrievers.move_to_end(scope)
+                return retriever
+
+        retriever = self.vector_db.get_retriever(user_role, user_department)
+
+        with self._retrievers_lock:
+            # Another worker may have built the same scope meanwhile; keep the first one
+            retriever = self._retrievers.setdefault(scope, retriever)
+            self._retrievers.move_to_end(scope)
+            while len(self._retrievers) > self.max_chains:
+                self._retrievers.popitem(last=False)
+        return retriever
+
+    def _structured_answer(self, question: str, user_role: str, user_department: str):
+        if not self.structured_engine:
+            return None
+        with stage_timer("structured_query"):
+            answer = self.structured_engine.answer(question, user_role, user_department)
+        if answer is not None:
+            answers_total.inc(source="structured")
+        return answer
+
+    def _cached_answer(self, scope: tuple, question: str):
+        """
+        Returns (cached answer or None, question vector to reuse when storing).
+        """
+        if not self.answer_cache:
+            return None, None
+        with stage_timer("answer_cache_lookup"):
+            cached, vector = self.answer_cache.lookup(scope, question)
+        if cached is not None:
+            answers_total.inc(source="cache")
+        return cached, vector
+
+    def _retrieve(self, question: str, user_role: str, user_department: str):
+        retriever = self._get_retriever(user_role, user_department)
+        with stage_timer("retrieval"):
+            docs = retriever.invoke(question)
+        retrieved_documents.observe(len(docs))
+        return docs
+
+    def _prompt_text(self, question: str, user_role: str, user_department: str, docs) -> str:
+        role = normalize_role(user_role)
+        # HR sees every department, so the prompt must not depend on the caller's one
+        department = "All" if role == "HR" else user_department
+        text, used = self.prompt_builder.build(question, role, department, docs)
+        if used < len(docs):
+            prompt_documents_dropped.inc(len(docs) - used)
+        prompt_tokens.observe(estimate_tokens(text))
+        return text
+
+    def _generate(self, tier: str, prompt_text: str) -> str:
+        with stage_timer("generation"), generation_seconds.time(tier=tier):
+            return self.llms[tier].invoke(prompt_text)
+
+    def _generate_stream(self, tier: str, prompt_text: str):
+        with stage_timer("generation"), generation_seconds.time(tier=tier):
+            yield from self.llms[tier].stream(prompt_text)
+
     def ask(self, question: str, user_role: str, user_department: str):
         try:
-            # Get RBAC-enforced retriever
-            retriever = self.vector_db.get_retriever(user_role, user_department)
-
-            # Build RetrievalQA chain with security prompt
-            retrieval_qa = RetrievalQA.from_chain_type(
-                llm=OllamaLLM(model="llama3.1"),
-                retriever=retriever,
-                chain_type_kwargs={"prompt": self.prompt}
+            answer = self._structured_answer(question, user_role, user_department)
+            if answer is not None:
+                return answer
+
+            # Answers are only ever shared between users of the same RBAC scope
+            scope = rbac_scope(user_role, user_department)
+            cached, vector = self._cached_answer(scope, question)
+            if cached is not None:
+                return cached
+
+            # Retrieve with the cached RBAC-enforced retriever, then generate
+            docs = self._retrieve(question, user_role, user_department)
+            return self._answer(question, user_role, user_department, docs, scope, vector)
+        except Exception as e:
+            raise RuntimeError(f"LLM response generation failed: {e}")
+
+    def _answer(self, question: str, user_role: str, user_department: str, docs, scope: tuple, vector) -> str:
+        """
+        Generate from retrieved documents on the routed tier and cache the answer.
+        """
+        prompt_text = self._prompt_text(question, user_role, user_department, docs)
+        tier, reason = self.router.route(question, docs)
+        try:
+            answer = self._generate(tier, prompt_text)
+        except Exception as e:
+            if tier == FULL:
+                raise
+            # The fast model may not be pulled or may be unhealthy; the full model still answers
+            logging.warning(f"Fast tier failed, escalating: {e}")
+            self.router.fast_tier_failed()
+            tier, reason = FULL, "fast_tier_error"
+            answer = self._generate(tier, prompt_text)
+        routing_decisions_total.inc(tier=tier, reason=reason)
+        completion_tokens.observe(estimate_tokens(answer))
+        answers_total.inc(source="llm")
+        if self.answer_cache:
+            self.answer_cache.store(scope, question, answer, vector)
+        return answer
+
+    def ask_batch(self, questions: list[str], user_role: str, user_department: str):
+        """
+        Answer many questions under one RBAC scope. The questions are embedded in one call and
+        retrieved with one multi-query search, then generated on the shared inference workers.
+        Yields (index, answer, error) as each answer completes; exactly one of answer and error
+        is None. Closing the generator cancels generations that have not started.
+        """
+        answered = set()
+        for i, question in enumerate(questions):
+            try:
+                answer = self._structured_answer(question, user_role, user_department)
+            except Exception as e:
+                logging.warning(f"Structured query failed, falling back to retrieval: {e}")
+                answer = None
+            if answer is not None:
+                answered.add(i)
+                yield i, answer, None
+
+        pending = [i for i in range(len(questions)) if i not in answered]
+        if not pending:
+            return
+        with stage_timer("embedding"):
+            embeddings = self.vector_db.embeddings.embed_documents([questions[i] for i in pending])
+
+        scope = rbac_scope(user_role, user_department)
+        vectors = {}
+        misses = []
+        for i, embedding in zip(pending, embeddings):
+            vector = None
+            if self.answer_cache:
+                # The semantic tier compares normalized vectors; reuse the batch embedding for it
+                if self.answer_cache.embed_fn is not None:
+                    vector = normalize_vector(embedding)
+                with stage_timer("answer_cache_lookup"):
+                    cached, vector = self.answer_cache.lookup(scope, questions[i], vector)
+                if cached is not None:
+                    answers_total.inc(source="cache")
+                    yield i, cached, None
+                    continue
+            vectors[i] = vector
+            misses.append((i, embedding))
+        if not misses:
+            return
+
+        with stage_timer("retrieval"):
+            batch_docs = self.vector_db.retrieve_batch(
+                [questions[i] for i, _ in misses], [embedding for _, embedding in misses],
+                user_role, user_department,
             )
+        # Repeated questions in one batch share a single generation
+        jobs = []
+        by_question = {}
+        for (i, _), docs in zip(misses, batch_docs):
+            duplicates = by_question.get(normalize_question(questions[i]))
+            if duplicates is not None:
+                duplicates.append(i)
+                continue
+            retrieved_documents.observe(len(docs))
+            by_question[normalize_question(questions[i])] = indexes = [i]
+            jobs.append((indexes, docs))
+        yield from self._generate_batch(jobs, questions, user_role, user_department, scope, vectors)
+
+    def _generate_batch(self, jobs: list, questions: list[str], user_role: str, user_department: str,
+                        scope: tuple, vectors: dict):
+        """
+        Generate batch answers on the shared inference workers, keeping only a small window of
+        them admitted at a time so interactive requests queue behind one generation at most.
+        """
+        window = max(min(inference_config.Batch_concurrency, inference_config.Max_workers - 1), 1)
+        pending = deque(jobs)
+        in_flight = {}
+        stalled_since = None
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < window:
+                    indexes, docs = pending[0]
+                    i = indexes[0]
+                    try:
+                        future = inference_pool.submit(
+                            self._answer, questions[i], user_role, user_department, docs, scope, vectors[i]
+                        )
+                    except InferenceQueueFull:
+                        break
+                    pending.popleft()
+                    in_flight[future] = indexes
+                    stalled_since = None
+
+                if not in_flight:
+                    # Interactive traffic fills the queue; back off, and give up after a request timeout
+                    stalled_since = stalled_since or time.monotonic()
+                    if time.monotonic() - stalled_since >= inference_config.Request_timeout_s:
+                        for indexes, _ in pending:
+                            for i in indexes:
+                                yield i, None, "The assistant is busy. Please retry shortly."
+                        return
+                    time.sleep(min(inference_config.Retry_after_s, 1.0))
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    indexes = in_flight.pop(future)
+                    try:
+                        answer, error = future.result(), None
+                    except Exception as e:
+                        logging.warning(f"Batch question failed: {e}")
+                        answer, error = None, f"LLM response generation failed: {e}"
+                    for i in indexes:
+                        yield i, answer, error
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def stream(self, question: str, user_role: str, user_department: str):
+        """
+        Generator version of `ask`. Yields ("sources", [metadata, ...]) once retrieval is done,
+        then ("token", text) for each chunk produced by the LLM.
+        Closing the generator stops generation on the Ollama side.
+        """
+        try:
+            answer = self._structured_answer(question, user_role, user_department)
+            if answer is not None:
+                yield "sources", []
+                yield "token", answer
+                return
+
+            scope = rbac_scope(user_role, user_department)
+            cached, vector = self._cached_answer(scope, question)
+            if cached is not None:
+                yield "sources", []
+                yield "token", cached
+                return
+
+            docs = self._retrieve(question, user_role, user_department)
+            yield "sources", [doc.metadata for doc in docs]
+
+            prompt_text = self._prompt_text(question, user_role, user_department, docs)
+            tier, reason = self.router.route(question, docs)
+            tokens = []
+            try:
+                for token in self._generate_stream(tier, prompt_text):
+                    tokens.append(token)
+                    yield "token", token
+            except Exception as e:
+                # Escalate only if nothing reached the client yet
+                if tier == FULL or tokens:
+                    raise
+                logging.warning(f"Fast tier failed, escalating: {e}")
+                self.router.fast_tier_failed()
+                tier, reason = FULL, "fast_tier_error"
+                for token in self._generate_stream(tier, prompt_text):
+                    tokens.append(token)
+                    yield "token", token
+            routing_decisions_total.inc(tier=tier, reason=reason)
+            answer = "".join(tokens)
+            completion_tokens.observe(estimate_tokens(answer))
+            answers_total.inc(source="llm")
 
-            # Run the query
-            return retrieval_qa.run({
-                "question": question,
-                "role": user_role,
-                "department": user_department
-            })
+            # Only completed answers are cached; a disconnect closes the generator before this
+            if self.answer_cache:
+                self.answer_cache.store(scope, question, answer, vector)
         except Exception as e:
             raise RuntimeError(f"LLM response generation failed: {e}")
@@ -1,14 +1,43 @@
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.security.dependencies import get_current_user
 
 from app.models.users import User
-from vector_db import VectorDB
-from llm_chain import CustomOrgChatChain
 from app.api.auth import router as auth_router
-from app.api.chat import router as chat_router
+from app.services.inference import batch_pool, inference_pool
+from app.security.password import password_manager
+from app.services.chat_log import chat_log_writer
+from app.services.single_flight import single_flight
+from app.databases.session import engine, pool_stats
+from app.security.principal_cache import principal_cache
+from app.security.login_throttle import login_throttle
+from app.monitoring.metrics import registry, MetricsMiddleware
+from app.services.chat_runtime import ChatRuntime
+from app.config import monitoring_config, runtime_config
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await chat_log_writer.start()
+    if runtime_config.Chat_enabled:
+        # Loads and warms up in the background; /ready reports when it is done
+        await app.state.chat_runtime.start()
+    yield
+    await app.state.chat_runtime.stop()
+    await chat_log_writer.stop()
+    batch_pool.shutdown()
+    inference_pool.shutdown()
+    password_manager.shutdown()
+    await engine.dispose()
 
-app = FastAPI(title="AI Organizational Chatbot", version="1.0.0")
+app = FastAPI(title="AI Organizational Chatbot", version="1.0.0", lifespan=lifespan)
+app.state.chat_runtime = ChatRuntime(
+    collection_name=runtime_config.Collection_name,
+    persist_directory=runtime_config.Persist_directory,
+    warm_up=runtime_config.Warmup_enabled,
+)
 
 # CORS middleware for frontend integration
 app.add_middleware(
@@ -19,9 +48,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include routers
+# Request latency histogram and trace ids; outermost so it also times CORS preflights
+app.add_middleware(
+    MetricsMiddleware,
+    tracing=monitoring_config.Tracing_enabled,
+    trace_header=monitoring_config.Trace_header,
+    slow_request_ms=monitoring_config.Slow_request_ms,
+)
+
+# Components' own counters, exported as gauges on /metrics
+registry.register_collector("inference", inference_pool.stats)
+registry.register_collector("batch", batch_pool.stats)
+registry.register_collector("single_flight", single_flight.stats)
+registry.register_collector("password", password_manager.stats)
+registry.register_collector("principal_cache", principal_cache.stats)
+registry.register_collector("login_throttle", login_throttle.stats)
+registry.register_collector("chat_log", chat_log_writer.stats)
+registry.register_collector("db_pool", pool_stats)
+registry.register_collector("chat_runtime", lambda: {"ready": int(app.state.chat_runtime.ready)})
+
+# Include routers; auth-only workers (CHAT_ENABLED=false) never import the chat stack
 app.include_router(auth_router)
-app.include_router(chat_router)
+if runtime_config.Chat_enabled:
+    from app.api.chat import router as chat_router
+    app.include_router(chat_router)
 
 @app.get("/")
 async def root():
@@ -29,4 +79,26 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "offline_chatbot"}
+    """
+    Liveness: the process is up and serving requests.
+    """
+    return {"status": "healthy", "service": "offline_chatbot", "database_pool": pool_stats()}
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once the chat models are loaded and warm, 503 until then.
+    """
+    runtime = app.state.chat_runtime
+    if not runtime_config.Chat_enabled:
+        return {"status": "ready", "mode": "auth_only"}
+    body = {"status": "ready" if runtime.ready else "not_ready", "mode": "chat", "runtime": runtime.stats()}
+    return JSONResponse(body, status_code=status.HTTP_200_OK if runtime.ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+if monitoring_config.Metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """
+        Prometheus text exposition format.
+        """
+        return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,271 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+# Metadata fields kept as integer-coded arrays for vectorized RBAC filtering
+FILTER_FIELDS = ("department", "role")
+# Rows scored per block, so int8 matrices are never dequantized in full
+BLOCK_ROWS = 8192
+# Index versions kept on disk: the published one and its predecessor, which readers that
+# read the manifest just before a publish are still opening
+KEEP_VERSIONS = 2
+
+
+def mmap_manifest_path(persist_directory: str, collection_name: str) -> str:
+    return os.path.join(persist_directory, f"{collection_name}.mmap.json")
+
+
+def _array_path(persist_directory: str, collection_name: str, version: str, name: str) -> str:
+    return os.path.join(persist_directory, f"{collection_name}.mmap.{version}.{name}.npy")
+
+
+def _documents_path(persist_directory: str, collection_name: str, version: str) -> str:
+    return os.path.join(persist_directory, f"{collection_name}.mmap.{version}.documents.json")
+
+
+def _save_array(path: str, array: np.ndarray):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 quantization: row ≈ codes * scale.
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class MmapIndex:
+    """
+    Read-only brute-force vector index over memory-mapped NumPy arrays. Every worker process
+    maps the same files, so the OS page cache holds one copy of the embeddings. Distances follow
+    the source collection's space (l2, cosine or ip) so rankings match Chroma's.
+    """
+
+    def __init__(self, manifest: dict, arrays: dict, documents: dict):
+        self.version = manifest["version"]
+        self.space = manifest["space"]
+        self.dtype = manifest["dtype"]
+        self.vocab = manifest["vocab"]
+        self.vectors = arrays["vectors"]
+        self.scales = arrays.get("scales")
+        self.norms = arrays.get("norms")
+        self.codes = {field: arrays[field] for field in FILTER_FIELDS}
+        self.ids = documents["ids"]
+        self.documents = documents["documents"]
+        self.metadatas = documents["metadatas"]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, persist_directory: str, collection_name: str, attempts: int = 3) -> "MmapIndex | None":
+        """
+        Map the published version. If its files vanish while opening them, a newer version was
+        published and this one garbage-collected meanwhile; re-read the manifest and retry.
+        """
+        for attempt in range(attempts):
+            try:
+                with open(mmap_manifest_path(persist_directory, collection_name)) as f:
+                    manifest = json.load(f)
+            except FileNotFoundError:
+                return None
+            try:
+                return cls._load_version(persist_directory, collection_name, manifest)
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+
+    @classmethod
+    def _load_version(cls, persist_directory: str, collection_name: str, manifest: dict) -> "MmapIndex":
+        version = manifest["version"]
+        names = ["vectors", *FILTER_FIELDS] + (["scales"] if manifest["dtype"] == "int8" else [])
+        if manifest["space"] == "l2":
+            names.append("norms")
+        arrays = {name: np.load(_array_path(persist_directory, collection_name, version, name), mmap_mode="r")
+                  for name in names}
+        with open(_documents_path(persist_directory, collection_name, version)) as f:
+            documents = json.load(f)
+        return cls(manifest, arrays, documents)
+
+    def _mask(self, filter_meta: dict) -> np.ndarray | None:
+        """
+        Boolean row mask for the filter, or None when it keeps every row.
+        """
+        mask = None
+        for key, value in filter_meta.items():
+            if key in self.codes:
+                code = self.vocab[key].get(str(value))
+                if code is None:
+                    return np.zeros(len(self), dtype=bool)
+                condition = self.codes[key] == code
+            else:
+                # Not indexed as an array; fall back to the stored metadata
+                condition = np.fromiter((metadata.get(key) == value for metadata in self.metadatas),
+                                        dtype=bool, count=len(self))
+            mask = condition if mask is None else mask & condition
+        return mask
+
+    def _distances(self, rows: np.ndarray | None, queries: np.ndarray) -> np.ndarray:
+        """
+        Distances (smaller is closer, up to a per-query constant) for the given rows, or all rows,
+        with one column per query; `queries` holds one query per column.
+        """
+        count = len(self) if rows is None else len(rows)
+        out = np.empty((count, queries.shape[1]), dtype=np.float32)
+        for start in range(0, count, BLOCK_ROWS):
+            block_rows = slice(start, start + BLOCK_ROWS) if rows is None else rows[start:start + BLOCK_ROWS]
+            block = np.asarray(self.vectors[block_rows], dtype=np.float32)
+            dots = block @ queries
+            if self.scales is not None:
+                dots *= self.scales[block_rows][:, None]
+            if self.space == "l2":
+                out[start:start + len(dots)] = self.norms[block_rows][:, None] - 2.0 * dots
+            else:
+                out[start:start + len(dots)] = -dots
+        return out
+
+    def search(self, embedding, filter_meta: dict, k: int) -> list[tuple[int, float]]:
+        """
+        Top-k (row, distance) among rows matching the filter, closest first.
+        """
+        return self.search_batch([embedding], filter_meta, k)[0]
+
+    def search_batch(self, embeddings, filter_meta: dict, k: int) -> list[list[tuple[int, float]]]:
+        """
+        `search` for several queries sharing one filter, scored in a single pass over the matrix.
+        """
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        if self.space == "cosine":
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            queries = queries / norms
+        mask = self._mask(filter_meta)
+        rows = None if mask is None else np.flatnonzero(mask)
+        if rows is not None and len(rows) == 0:
+            return [[] for _ in range(len(queries))]
+
+        distances = self._distances(rows, queries.T)
+        k = min(k, len(distances))
+        # Restore the per-query constant so distances read like Chroma's:
+        # squared L2, or 1 - similarity for cosine and inner product
+        offsets = np.einsum("ij,ij->i", queries, queries) if self.space == "l2" else np.ones(len(queries))
+        results = []
+        for column, offset in zip(distances.T, offsets):
+            top = np.argpartition(column, k - 1)[:k] if k < len(column) else np.arange(len(column))
+            top = top[np.argsort(column[top], kind="stable")]
+            selected = top if rows is None else rows[top]
+            results.append([(int(row), float(column[i] + offset)) for row, i in zip(selected, top)])
+        return results
+
+
+def build_from_chroma(persist_directory: str, collection_name: str, dtype: str = "int8",
+                      page_size: int = 5000) -> dict:
+    """
+    Export a Chroma collection into a new version of the memory-mapped index and publish it
+    by atomically replacing the manifest. The previous version is kept for readers that are
+    opening it right now; older ones are removed, and processes that still map them keep
+    working until they reload.
+    """
+    import chromadb
+
+    if dtype not in ("int8", "float32"):
+        raise ValueError(f"Unsupported dtype {dtype!r}; use int8 or float32")
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=persist_directory)
+    collection = client.get_collection(collection_name)
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+
+    ids, documents, metadatas, chunks = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "metadatas", "documents"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(metadata or {} for metadata in page["metadatas"])
+        chunks.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    if not ids:
+        raise ValueError(f"Collection {collection_name!r} is empty")
+    vectors = np.concatenate(chunks)
+
+    if space == "cosine":
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+
+    vocab = {}
+    arrays = {}
+    for field in FILTER_FIELDS:
+        values = sorted({str(metadata.get(field)) for metadata in metadatas})
+        vocab[field] = {value: code for code, value in enumerate(values)}
+        arrays[field] = np.array([vocab[field][str(metadata.get(field))] for metadata in metadatas], dtype=np.int32)
+    if space == "l2":
+        arrays["norms"] = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+    if dtype == "int8":
+        arrays["vectors"], arrays["scales"] = quantize_int8(vectors)
+    else:
+        arrays["vectors"] = vectors
+
+    version = str(time.time_ns())
+    for name, array in arrays.items():
+        _save_array(_array_path(persist_directory, collection_name, version, name), array)
+    with open(_documents_path(persist_directory, collection_name, version), "w") as f:
+        json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f)
+
+    manifest = {"version": version, "dtype": dtype, "space": space, "count": len(ids),
+                "dimensions": int(vectors.shape[1]), "vocab": vocab}
+    manifest_path = mmap_manifest_path(persist_directory, collection_name)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    _remove_old_versions(persist_directory, collection_name, keep=KEEP_VERSIONS)
+    stats = {"version": version, "count": len(ids), "dimensions": manifest["dimensions"], "dtype": dtype,
+             "space": space, "bytes": int(arrays["vectors"].nbytes),
+             "seconds": round(time.perf_counter() - started, 2)}
+    logging.info(f"Built mmap index: {stats}")
+    return stats
+
+
+def _remove_old_versions(persist_directory: str, collection_name: str, keep: int):
+    """
+    Remove the files of every version but the newest `keep`.
+    """
+    prefix = f"{collection_name}.mmap."
+    files = {}
+    for name in os.listdir(persist_directory):
+        version = name[len(prefix):].split(".", 1)[0]
+        if name.startswith(prefix) and version.isdigit():
+            files.setdefault(version, []).append(name)
+    for version in sorted(files, key=int)[:-keep]:
+        for name in files[version]:
+            try:
+                os.remove(os.path.join(persist_directory, name))
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Build the memory-mapped vector index from a Chroma collection")
+    parser.add_argument("--collection", default="org_employees")
+    parser.add_argument("--persist-dir", default="./chroma_persist")
+    parser.add_argument("--dtype", choices=["int8", "float32"], default="int8")
+    args = parser.parse_args()
+
+    from vector_db import read_active_collection
+    # Index the version readers are served, when ingest publishes blue/green versions
+    collection = read_active_collection(args.persist_dir, args.collection) or args.collection
+    print(build_from_chroma(args.persist_dir, collection, dtype=args.dtype))
@@ -0,0 +1,96 @@
+import re
+import time
+
+from app.config import llm_config
+from employee_data import DOCUMENT_FIELDS
+from lexical_index import tokenize
+
+FAST = "fast"
+FULL = "full"
+
+# Wording that asks for reasoning, synthesis or several records rather than a single fact
+_COMPLEX = re.compile(
+    r"\b(why|how (?:should|could|would|can|do)|explain|compare|comparison|difference|versus|vs|"
+    r"analy[sz]e|analysis|trend|summar(?:y|ize|ise)|recommend|suggest|evaluate|assess|plan|"
+    r"pros|cons|impact|strategy|predict|list all|all employees|everyone|overview|report)\b"
+)
+_CONJUNCTION = re.compile(r"\b(and|or|but|also|then)\b")
+
+# Field labels appear in every document, so matching them says nothing about relevance
+_FIELD_WORDS = {token for label, _ in DOCUMENT_FIELDS for token in tokenize(label)} | {"employee", "employees"}
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "what", "who", "whom", "which", "where", "when",
+    "of", "in", "on", "for", "to", "my", "me", "i", "do", "does", "did", "tell", "about", "please",
+    "can", "you", "show", "give", "find", "their", "his", "her", "its", "our", "with", "at", "by",
+}
+
+
+def retrieval_confidence(question: str, docs) -> float:
+    """
+    Share of the question's content words (not stopwords or field labels) that appear in the
+    best retrieved document. Exact employee-id / name lookups score 1.0; no documents score 0.0.
+    """
+    if not docs:
+        return 0.0
+    terms = {token for token in tokenize(question) if token not in _STOPWORDS and token not in _FIELD_WORDS}
+    if not terms:
+        return 1.0
+    found = set(tokenize(docs[0].page_content))
+    return len(terms & found) / len(terms)
+
+
+class ModelRouter:
+    """
+    Picks the model tier for a question: short single-fact questions whose retrieval clearly
+    covers them go to the fast tier, everything else to the full model.
+    """
+
+    def __init__(self, enabled: bool, simple_max_words: int, min_confidence: float,
+                 fast_retry_after_s: float = 60.0):
+        self.enabled = enabled
+        self.simple_max_words = simple_max_words
+        self.min_confidence = min_confidence
+        self.fast_retry_after_s = fast_retry_after_s
+        self._fast_unavailable_until = 0.0
+
+    def fast_tier_failed(self):
+        """
+        Route everything to the full model for a while, e.g. when the fast model is not pulled.
+        """
+        self._fast_unavailable_until = time.monotonic() + self.fast_retry_after_s
+
+    def classify(self, question: str) -> tuple[str, str]:
+        """
+        Question-only decision, made before retrieval. Returns (tier, reason).
+        """
+        if not self.enabled:
+            return FULL, "routing_disabled"
+        q = question.lower()
+        if len(q.split()) > self.simple_max_words:
+            return FULL, "long_question"
+        if _COMPLEX.search(q):
+            return FULL, "complex_wording"
+        if len(_CONJUNCTION.findall(q)) > 1 or q.count("?") > 1:
+            return FULL, "multi_part"
+        return FAST, "simple_question"
+
+    def route(self, question: str, docs) -> tuple[str, str]:
+        """
+        Final decision once retrieval is done: a simple question is escalated when the
+        retrieved documents do not clearly answer it.
+        """
+        tier, reason = self.classify(question)
+        if tier == FAST and time.monotonic() < self._fast_unavailable_until:
+            return FULL, "fast_tier_unavailable"
+        if tier == FAST and docs and retrieval_confidence(question, docs) < self.min_confidence:
+            return FULL, "low_retrieval_confidence"
+        return tier, reason
+
+
+# Global instance
+model_router = ModelRouter(
+    enabled=llm_config.Routing_enabled and llm_config.Fast_model != llm_config.Chat_model,
+    simple_max_words=llm_config.Routing_simple_max_words,
+    min_confidence=llm_config.Routing_min_confidence,
+)
@@ -0,0 +1,124 @@
+import re
+
+from app.config import prompt_config
+from app.monitoring.metrics import estimate_tokens
+
+# Static persona and RBAC rules. Kept byte-identical and first in every prompt so Ollama can
+# reuse the evaluated prefix from its prompt cache instead of prefilling it on each request.
+SYSTEM_PREFIX = """
+You are an **AI-Powered Offline Organizational Chatbot**.
+Background:
+Organisations generate and store vast amounts of employee information across HR, administration, and employee portals. Traditional systems require manual navigation through multiple apps. You simplify this by letting employees, managers, and HR query data conversationally.
+
+⚠️ Key Rules:
+- Ensure **data security**.
+- Apply **role-based access control (RBAC)**:
+  - HR: Can access all employee data.
+  - Managers: Can only access their department’s data.
+  - Employees: Can only access their own data.
+- Never invent or expose data you don’t have access to.
+- Always run **offline** without using external services.
+"""
+
+# Per-scope part: identical for every user of the same scope, so it extends the cached prefix
+SCOPE_TEMPLATE = """
+Role: {role}
+Department: {department}
+"""
+
+QUESTION_TEMPLATE = """
+Retrieved information:
+{context}
+
+Question: {question}
+
+Answer concisely, securely, and based only on retrieved information.
+"""
+
+NO_CONTEXT = "(no matching records)"
+
+# Always kept so every record stays identifiable
+IDENTITY_FIELDS = ("EmployeeID", "Name", "Job Title", "Department")
+
+# Document field -> question words that make it relevant
+FIELD_KEYWORDS = {
+    "Business Unit": ("business", "unit", "division", "bu"),
+    "Country": ("country", "where", "location", "located", "based", "live", "lives"),
+    "City": ("city", "where", "location", "located", "based", "office", "live", "lives"),
+    "Annual Salary": ("salary", "salaries", "pay", "paid", "earn", "earns", "compensation", "income", "wage"),
+    "Bonus %": ("bonus", "bonuses", "incentive"),
+}
+
+_FIELD_LINE = re.compile(r"^([^:\n]+):\s*(.*)$")
+_WORD = re.compile(r"[a-z]+")
+
+
+def relevant_fields(question: str) -> set[str] | None:
+    """
+    Fields worth showing for this question beyond the identity fields; None means all of them.
+    """
+    words = set(_WORD.findall(question.lower()))
+    fields = {field for field, keywords in FIELD_KEYWORDS.items() if words.intersection(keywords)}
+    return fields or None
+
+
+def compact_document(text: str, fields: set[str] | None) -> str:
+    """
+    One line per record: "EmployeeID: E02387; Name: Emily Davis; ..." with only the wanted fields.
+    Text that is not in the "Label: value" format is kept, collapsed onto one line.
+    """
+    parts = []
+    for line in text.splitlines():
+        match = _FIELD_LINE.match(line.strip())
+        if not match:
+            if line.strip():
+                parts.append(line.strip())
+            continue
+        label, value = match.group(1).strip(), match.group(2).strip()
+        if fields is None or label in IDENTITY_FIELDS or label in fields or label not in FIELD_KEYWORDS:
+            parts.append(f"{label}: {value}")
+    return "; ".join(parts)
+
+
+class PromptBuilder:
+    """
+    Builds the generation prompt: static prefix, scope, then compacted context and the
+    question, with the retrieved records trimmed to fit a token budget (chars / 4 estimate).
+    """
+
+    def __init__(self, max_prompt_tokens: int, compact: bool = True):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.compact = compact
+        self.prefix_tokens = estimate_tokens(SYSTEM_PREFIX)
+
+    def build(self, question: str, role: str, department: str, docs) -> tuple[str, int]:
+        """
+        Returns (prompt, number of retrieved documents that fit in the budget).
+        """
+        head = SYSTEM_PREFIX + SCOPE_TEMPLATE.format(role=role, department=department)
+        fixed_tokens = estimate_tokens(head) + estimate_tokens(QUESTION_TEMPLATE.format(context="", question=question))
+        budget = self.max_prompt_tokens - fixed_tokens
+
+        fields = relevant_fields(question) if self.compact else None
+        records = []
+        for doc in docs:
+            record = compact_document(doc.page_content, fields) if self.compact else doc.page_content
+            # +1 for the separating newline
+            cost = estimate_tokens(record) + 1
+            if cost > budget:
+                if not records and budget > 0:
+                    # Never send an empty context when the best record is merely long
+                    records.append(record[:budget * 4])
+                break
+            records.append(record)
+            budget -= cost
+
+        context = "\n".join(records) if records else NO_CONTEXT
+        return head + QUESTION_TEMPLATE.format(context=context, question=question), len(records)
+
+
+# Global instance
+prompt_builder = PromptBuilder(
+    max_prompt_tokens=prompt_config.Max_prompt_tokens,
+    compact=prompt_config.Compact_context,
+)
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+
+from app.config import provisioning_config
+from app.databases.session import AsyncSessionLocal, engine
+from app.security.password import password_manager
+from app.services.provisioning import read_employee_rows, user_provisioner
+
+
+def write_credentials(path: str, credentials: list[dict]):
+    """
+    Temporary passwords go to a file only the current user can read, never to the log.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["username", "temporary_password"])
+        writer.writeheader()
+        writer.writerows(credentials)
+
+
+async def provision(path: str) -> dict:
+    with open(path, "rb") as f:
+        rows = read_employee_rows(f.read())
+    try:
+        async with AsyncSessionLocal() as db:
+            return await user_provisioner.provision(db, rows)
+    finally:
+        password_manager.shutdown()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Create user accounts for every employee in an HR export")
+    parser.add_argument("--file", default=provisioning_config.Dataset_path)
+    parser.add_argument("--credentials-out", default="provisioned_credentials.csv",
+                        help="CSV receiving the temporary password of each created user")
+    parser.add_argument("--batch-size", type=int, default=provisioning_config.Batch_size)
+    args = parser.parse_args()
+
+    user_provisioner.batch_size = args.batch_size
+    report = asyncio.run(provision(args.file))
+    write_credentials(args.credentials_out, report.pop("credentials"))
+    errors = report.pop("errors")
+    print(json.dumps(report, indent=2))
+    for error in errors[:50]:
+        print(f"row {error['row']} ({error['username']}): {error['error']}")
+    if len(errors) > 50:
+        print(f"... and {len(errors) - 50} more errors")
+    print(f"Temporary credentials written to {args.credentials_out}")
@@ -0,0 +1,185 @@
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from employee_data import detect_encoding
+from vector_db import VectorDB, normalize_role
+
+# Columns whose values can be named in a question to narrow the rows, e.g. "in Seattle"
+FILTER_COLUMNS = ["Department", "Business Unit", "Country", "City", "Job Title", "Gender", "Ethnicity"]
+
+# Question wording -> numeric column
+METRICS = {
+    "salary": "Annual Salary",
+    "salaries": "Annual Salary",
+    "pay": "Annual Salary",
+    "paid": "Annual Salary",
+    "bonus": "Bonus %",
+    "bonuses": "Bonus %",
+    "age": "Age",
+}
+
+AGGREGATIONS = {
+    "average": "mean", "avg": "mean", "mean": "mean",
+    "median": "median",
+    "maximum": "max", "max": "max", "highest": "max",
+    "minimum": "min", "min": "min", "lowest": "min",
+    "total": "sum", "sum": "sum",
+}
+
+_EEID = re.compile(r"\bE\d{5}\b", re.IGNORECASE)
+_COUNT = re.compile(r"\b(how many|count|number of|headcount)\b")
+_PEOPLE = re.compile(r"\b(employees?|people|persons?|staff|workers?|headcount)\b")
+_TOP_N = re.compile(r"\btop\s+(\d+)\b|\b(\d+)\s+(?:highest|best|top)[- ]paid\b")
+_FORMER = re.compile(r"\b(former|exited|left|leavers?)\b")
+_METRIC = re.compile(r"\b(" + "|".join(METRICS) + r")\b")
+_AGGREGATION = re.compile(r"\b(" + "|".join(AGGREGATIONS) + r")\b")
+
+# Roles allowed to see other employees' records, statistics and pay
+_PRIVILEGED_ROLES = ("HR", "manager")
+PAY_FIELDS = ("Annual Salary", "Bonus %")
+
+
+def _parse_number(series: pd.Series) -> np.ndarray:
+    """
+    "$141,604 " -> 141604.0, "15% " -> 15.0
+    """
+    cleaned = series.astype(str).str.replace(r"[$,%\s]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=np.float64)
+
+
+class StructuredQueryEngine:
+    """
+    Answers aggregate and lookup questions (counts, averages, top-N, EEID lookups) directly
+    from the employee dataset, with the same RBAC scoping as the vector store.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.drop_duplicates(subset="EEID", keep="last").reset_index(drop=True)
+        self.df = df
+        self.numeric = {
+            "Annual Salary": _parse_number(df["Annual Salary"]),
+            "Bonus %": _parse_number(df["Bonus %"]),
+            "Age": _parse_number(df["Age"]),
+        }
+        self.current = df["Exit Date"].isna().to_numpy() if "Exit Date" in df else np.ones(len(df), bool)
+        self.eeids = df["EEID"].astype(str).str.upper().to_numpy()
+
+        # One alternation per column, longest values first so "Engineering Manager" beats "Manager"
+        self.column_values = {}
+        self.column_patterns = {}
+        for column in FILTER_COLUMNS:
+            if column not in df:
+                continue
+            values = sorted(df[column].dropna().astype(str).str.strip().unique(), key=len, reverse=True)
+            self.column_values[column] = {value.lower(): value for value in values}
+            alternation = "|".join(re.escape(value.lower()) for value in values)
+            self.column_patterns[column] = re.compile(rf"(?<!\w)({alternation})s?(?!\w)")
+        self.lowered = {column: df[column].astype(str).str.strip().str.lower().to_numpy()
+                        for column in self.column_values}
+
+    @classmethod
+    def from_file(cls, path: str) -> "StructuredQueryEngine":
+        if path.endswith('.json'):
+            return cls(pd.read_json(path))
+        return cls(pd.read_csv(path, encoding=detect_encoding(path)))
+
+    def _scope_mask(self, user_role: str, user_department: str) -> np.ndarray:
+        """
+        Row mask equivalent to the vector store's RBAC metadata filter.
+        """
+        mask = np.ones(len(self.df), dtype=bool)
+        filter_meta = VectorDB.build_filter(user_role, user_department)
+        if "department" in filter_meta:
+            mask &= self.lowered["Department"] == str(filter_meta["department"]).strip().lower()
+        # The employee scope's role condition matches every row; `answer` skips employees instead
+        return mask
+
+    def _question_filters(self, question: str) -> tuple[np.ndarray, list[str]]:
+        mask = np.ones(len(self.df), dtype=bool)
+        labels = []
+        for column, pattern in self.column_patterns.items():
+            matches = {m.group(1) for m in pattern.finditer(question)}
+            if not matches:
+                continue
+            mask &= np.isin(self.lowered[column], list(matches))
+            labels.extend(self.column_values[column][m] for m in sorted(matches))
+        return mask, labels
+
+    def answer(self, question: str, user_role: str, user_department: str) -> Optional[str]:
+        """
+        Return an answer if the question is a recognized structured query, otherwise None.
+        Structured answers cover records other than the caller's own and are shared across a
+        whole RBAC scope, so employees' questions are left to the RBAC-filtered retrieval path.
+        """
+        privileged = normalize_role(user_role) in _PRIVILEGED_ROLES
+        if not privileged:
+            return None
+        q = question.lower()
+        scope = self._scope_mask(user_role, user_department)
+
+        eeid = _EEID.search(question)
+        if eeid and not (_COUNT.search(q) or _AGGREGATION.search(q)):
+            return self._lookup(eeid.group(0).upper(), scope, show_pay=privileged)
+
+        filters, labels = self._question_filters(q)
+        top_n = _TOP_N.search(q)
+        # "how many vacation days" is not a headcount; require people or a job title
+        title_pattern = self.column_patterns.get("Job Title")
+        count = _COUNT.search(q) and (_PEOPLE.search(q) or (title_pattern and title_pattern.search(q)))
+        metric = _METRIC.search(q)
+        aggregation = _AGGREGATION.search(q)
+        if not (top_n or count or (metric and aggregation)):
+            return None
+
+        mask = scope & filters & (~self.current if _FORMER.search(q) else self.current)
+        where = f" ({', '.join(labels)})" if labels else ""
+        matched = int(mask.sum())
+        if matched == 0:
+            return f"No matching employees{where} within your access scope."
+
+        if top_n:
+            n = int(top_n.group(1) or top_n.group(2))
+            column = METRICS[metric.group(1)] if metric else "Annual Salary"
+            return self._top_n(n, column, mask, where)
+        if metric and aggregation:
+            column = METRICS[metric.group(1)]
+            how = AGGREGATIONS[aggregation.group(1)]
+            values = self.numeric[column][mask]
+            values = values[~np.isnan(values)]
+            result = getattr(np, how)(values) if len(values) else float("nan")
+            return f"{aggregation.group(1).capitalize()} {column.lower()}{where}: {self._format(column, result)} across {matched} employees."
+        return f"{matched} employees{where}."
+
+    def _lookup(self, eeid: str, scope: np.ndarray, show_pay: bool) -> str:
+        rows = np.flatnonzero((self.eeids == eeid) & scope)
+        if len(rows) == 0:
+            return f"No employee {eeid} within your access scope."
+        row = self.df.iloc[rows[0]]
+        fields = ["Full Name", "Job Title", "Department", "Business Unit", "City", "Country"]
+        if show_pay:
+            fields.extend(PAY_FIELDS)
+        return f"{eeid}: " + "; ".join(f"{field}: {str(row[field]).strip()}" for field in fields if field in row)
+
+    def _top_n(self, n: int, column: str, mask: np.ndarray, where: str) -> str:
+        rows = np.flatnonzero(mask)
+        values = self.numeric[column][rows]
+        order = rows[np.argsort(-np.nan_to_num(values, nan=-np.inf), kind="stable")[:n]]
+        lines = [
+            f"{i}. {self.df.at[row, 'Full Name']} ({self.eeids[row]}, {self.df.at[row, 'Job Title']}) - "
+            f"{self._format(column, self.numeric[column][row])}"
+            for i, row in enumerate(order, start=1)
+        ]
+        return f"Top {len(order)} by {column.lower()}{where}:\n" + "\n".join(lines)
+
+    @staticmethod
+    def _format(column: str, value: float) -> str:
+        if np.isnan(value):
+            return "n/a"
+        if column == "Annual Salary":
+            return f"${value:,.0f}"
+        if column == "Bonus %":
+            return f"{value:.1f}%"
+        return f"{value:.1f}"
@@ -0,0 +1,55 @@
+from answer_cache import AnswerCache
+from vector_db import rbac_scope, write_ingest_marker
+
+
+def constant_embedding(question):
+    # Every question looks alike, so only scope and entities keep answers apart
+    return [1.0, 0.0, 0.0]
+
+
+def make_cache(**kwargs):
+    options = dict(embed_fn=constant_embedding, max_entries=100, ttl_s=60, similarity_threshold=0.9)
+    options.update(kwargs)
+    return AnswerCache(**options)
+
+
+def test_scope_keys_follow_the_rbac_filter():
+    assert rbac_scope("manager", "IT") == rbac_scope("Manager", "IT")
+    assert rbac_scope("HR", "IT") == rbac_scope("hr", "Finance")
+    assert rbac_scope("manager", "IT") != rbac_scope("manager", "Finance")
+    assert rbac_scope("manager", "IT") != rbac_scope("employee", "IT")
+    assert rbac_scope("HR", "IT") != rbac_scope("manager", "IT")
+
+
+def test_answers_do_not_cross_scopes():
+    cache = make_cache()
+    it_managers = rbac_scope("manager", "IT")
+    cache.store(it_managers, "How many people report to me?", "12 employees.")
+
+    assert cache.lookup(it_managers, "how many people report to me")[0] == "12 employees."
+    for role, department in (("manager", "Finance"), ("employee", "IT"), ("HR", "IT")):
+        assert cache.lookup(rbac_scope(role, department), "How many people report to me?")[0] is None
+
+
+def test_semantic_tier_requires_the_same_entities():
+    cache = make_cache()
+    scope = rbac_scope("HR", "")
+    cache.store(scope, "What is the salary of E01234?", "$90,000")
+
+    assert cache.lookup(scope, "Salary of E01234 please")[0] == "$90,000"
+    assert cache.lookup(scope, "What is the salary of E04321?")[0] is None
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1
+    assert stats["entity_mismatches"] == 1
+
+
+def test_new_ingest_drops_cached_answers(tmp_path):
+    write_ingest_marker(str(tmp_path))
+    cache = make_cache(persist_directory=str(tmp_path), ingest_check_interval_s=0)
+    scope = rbac_scope("HR", "")
+    cache.store(scope, "How many employees?", "1000 employees.")
+    assert cache.lookup(scope, "How many employees?")[0] == "1000 employees."
+
+    write_ingest_marker(str(tmp_path))
+    assert cache.lookup(scope, "How many employees?")[0] is None
+    assert cache.stats()["invalidations"] == 1
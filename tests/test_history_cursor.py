@@ -0,0 +1,34 @@
+import base64
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.chat import decode_history_cursor, encode_history_cursor
+
+
+@pytest.mark.parametrize("timestamp", [
+    datetime(2024, 5, 1, 12, 30, 15, 123456),
+    datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+    datetime(2024, 5, 1, 12, 30, tzinfo=timezone(timedelta(hours=-5, minutes=-30))),
+])
+def test_cursor_round_trips(timestamp):
+    cursor = encode_history_cursor(timestamp, "0b6f4c1e-9d2a-4c55-9a43-2d1f0c8e7b11")
+    assert decode_history_cursor(cursor) == (timestamp, "0b6f4c1e-9d2a-4c55-9a43-2d1f0c8e7b11")
+
+
+def test_cursor_is_safe_in_a_query_string():
+    cursor = encode_history_cursor(datetime(2024, 5, 1, tzinfo=timezone.utc), "abc")
+    assert "+" not in cursor and "/" not in cursor and "=" not in cursor and " " not in cursor
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b"no separator").decode(),
+    base64.urlsafe_b64encode(b"yesterday|abc").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|abc").decode(),
+])
+def test_bad_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_history_cursor(cursor)
+    assert error.value.status_code == 400
@@ -0,0 +1,76 @@
+import pytest
+
+from app.security import login_throttle
+from app.security.login_throttle import LoginThrottle
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(login_throttle, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def throttle(clock):
+    return LoginThrottle(window_s=60, max_per_user=3, max_per_ip=5, max_keys=100)
+
+
+def test_user_is_throttled_after_max_failures(throttle, clock):
+    for _ in range(3):
+        assert throttle.retry_after("alice", "10.0.0.1") is None
+        throttle.failed("alice", "10.0.0.1")
+        clock.now += 1
+
+    # Usernames are matched case-insensitively, and from any address
+    assert throttle.retry_after(" Alice", "10.0.0.2") == pytest.approx(57)
+    assert throttle.retry_after("bob", "10.0.0.2") is None
+    assert throttle.rejected == 1
+
+    clock.now += 57
+    assert throttle.retry_after("alice", "10.0.0.1") is None
+
+
+def test_ip_is_throttled_across_usernames(throttle, clock):
+    for i in range(5):
+        throttle.failed(f"user{i}", "10.0.0.1")
+
+    assert throttle.retry_after("someone-else", "10.0.0.1") == pytest.approx(60)
+    assert throttle.retry_after("someone-else", "10.0.0.9") is None
+
+
+def test_lock_rejects_until_it_expires(throttle, clock):
+    throttle.lock("alice", 300)
+    assert throttle.retry_after("alice", "10.0.0.1") == pytest.approx(300)
+
+    clock.now += 300
+    assert throttle.retry_after("alice", "10.0.0.1") is None
+
+
+def test_success_clears_the_user_but_not_the_ip(throttle, clock):
+    for _ in range(5):
+        throttle.failed("alice", "10.0.0.1")
+    throttle.lock("alice", 300)
+
+    throttle.succeeded("alice")
+    assert throttle.retry_after("alice", "10.0.0.2") is None
+    assert throttle.retry_after("alice", "10.0.0.1") is not None
+
+
+def test_keys_are_bounded(clock):
+    throttle = LoginThrottle(window_s=60, max_per_user=1, max_per_ip=100, max_keys=4)
+    for i in range(10):
+        throttle.failed(f"user{i}", "10.0.0.1")
+
+    # Oldest keys go first, so the latest user is still throttled
+    assert len(throttle._failures) == 4
+    assert throttle.retry_after("user9", "10.0.0.2") is not None
+    assert throttle.retry_after("user0", "10.0.0.2") is None
@@ -0,0 +1,66 @@
+import asyncio
+
+from app.api.chat import coalescing_key
+from app.models.users import UserRoleEnum
+from app.security.principal_cache import UserPrincipal
+from app.services.single_flight import SingleFlight
+
+
+def principal(role: UserRoleEnum, department: str) -> UserPrincipal:
+    return UserPrincipal(id=f"{role.value}-{department}", username="user", full_name="User",
+                         role=role, department=department, is_active=True)
+
+
+def test_only_callers_in_the_same_scope_coalesce():
+    question = "How many employees are in IT?"
+    it_manager = coalescing_key(principal(UserRoleEnum.manager, "IT"), question)
+    assert it_manager == coalescing_key(principal(UserRoleEnum.manager, "IT"), "how many employees are in it")
+    assert it_manager != coalescing_key(principal(UserRoleEnum.manager, "Finance"), question)
+    assert it_manager != coalescing_key(principal(UserRoleEnum.employee, "IT"), question)
+    assert it_manager != coalescing_key(principal(UserRoleEnum.admin, "IT"), question)
+
+
+def test_concurrent_calls_share_one_run_per_key():
+    async def scenario():
+        flight = SingleFlight()
+        runs = []
+
+        async def work(key):
+            runs.append(key)
+            await asyncio.sleep(0.01)
+            return f"answer for {key}"
+
+        results = await asyncio.gather(*(flight.do(key, lambda key=key: work(key))
+                                         for key in ("a", "a", "a", "b")))
+        return results, runs, flight.stats()
+
+    results, runs, stats = asyncio.run(scenario())
+    assert results == ["answer for a"] * 3 + ["answer for b"]
+    assert sorted(runs) == ["a", "b"]
+    assert stats == {"in_flight": 0, "leaders": 2, "followers": 2}
+
+
+def test_stream_stops_when_its_only_reader_never_reads():
+    async def scenario():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def tokens():
+            try:
+                while True:
+                    yield "token"
+                    await asyncio.sleep(0.01)
+            finally:
+                cancelled.set()
+
+        reader = flight.stream("key", tokens)
+        first = await reader.__anext__()
+        # A second caller that goes away before reading must not keep the generation running
+        await flight.stream("key", tokens).aclose()
+        await reader.aclose()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        return first, flight.stats()
+
+    first, stats = asyncio.run(scenario())
+    assert first == "token"
+    assert stats["in_flight"] == 0
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from structured_query import StructuredQueryEngine
+
+COLUMNS = ["EEID", "Full Name", "Job Title", "Department", "Business Unit", "Gender", "Ethnicity",
+           "Age", "Hire Date", "Annual Salary", "Bonus %", "Country", "City", "Exit Date"]
+ROWS = [
+    ["E00001", "Ada Park", "Network Engineer", "IT", "Research & Development", "Female", "Asian",
+     41, "1/2/2015", "$120,000 ", "10% ", "United States", "Austin", None],
+    ["E00002", "Ben Ortiz", "Analyst", "IT", "Manufacturing", "Male", "Latino",
+     33, "3/4/2018", "$80,000 ", "0% ", "United States", "Seattle", None],
+    ["E00003", "Cara Stone", "Controller", "Finance", "Corporate", "Female", "Caucasian",
+     50, "5/6/2010", "$150,000 ", "20% ", "United States", "Miami", None],
+]
+
+
+@pytest.fixture
+def engine():
+    return StructuredQueryEngine(pd.DataFrame(ROWS, columns=COLUMNS))
+
+
+def test_employees_fall_through_to_retrieval(engine):
+    assert engine.answer("How many employees are in IT?", "employee", "IT") is None
+    assert engine.answer("What is the average salary?", "Employee", "IT") is None
+    assert engine.answer("Tell me about E00003", "", "IT") is None
+
+
+def test_hr_sees_every_department(engine):
+    assert engine.answer("How many employees?", "HR", "Finance") == "3 employees."
+
+
+def test_manager_is_limited_to_their_department(engine):
+    assert engine.answer("How many employees?", "manager", "IT") == "2 employees."
+    assert engine.answer("How many employees in Finance?", "manager", "IT").startswith("No matching employees")
+    assert engine.answer("Tell me about E00003", "manager", "IT") == "No employee E00003 within your access scope."
+    assert "Cara Stone" not in engine.answer("Top 5 highest paid", "manager", "IT")
+
+
+def test_manager_aggregates_cover_only_their_department(engine):
+    assert engine.answer("What is the average salary?", "manager", "IT") == \
+        "Average annual salary: $100,000 across 2 employees."
+
+
+def test_lookup_shows_pay_to_privileged_roles(engine):
+    answer = engine.answer("Tell me about E00001", "manager", "IT")
+    assert answer.startswith("E00001: Full Name: Ada Park")
+    assert "Annual Salary: $120,000" in answer
@@ -1,30 +1,527 @@
+import hashlib
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.config import vector_store_config
+from app.monitoring.metrics import stage_timer
+from embedding_cache import build_embeddings
+from lexical_index import LexicalIndex, lexical_index_path, reciprocal_rank_fusion
+from mmap_index import MmapIndex, mmap_manifest_path
+
+# Written by ingest_data.py after every successful ingest; readers use it to drop stale caches
+INGEST_MARKER_FILE = "ingest_version"
+
+# Shared by every VectorDB for HR-wide searches across department partitions
+_fanout_executor = ThreadPoolExecutor(
+    max_workers=vector_store_config.Fanout_workers, thread_name_prefix="partition-search"
+)
+
+
+def write_ingest_marker(persist_directory: str) -> str:
+    """
+    Record a new ingest version in the persist directory and return it.
+    """
+    version = str(time.time_ns())
+    path = os.path.join(persist_directory, INGEST_MARKER_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_ingest_marker(persist_directory: str) -> str | None:
+    """
+    Return the current ingest version, or None if nothing has been ingested with a marker yet.
+    """
+    try:
+        with open(os.path.join(persist_directory, INGEST_MARKER_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def active_manifest_path(persist_directory: str, collection_name: str) -> str:
+    return os.path.join(persist_directory, f"{collection_name}.active.json")
+
+
+def versioned_collection_name(collection_name: str) -> str:
+    """
+    Name of a new blue/green version of a collection: <name>.v<time_ns>.
+    """
+    return f"{collection_name}.v{time.time_ns()}"
+
+
+def read_active_collection(persist_directory: str, collection_name: str) -> str | None:
+    """
+    The versioned collection currently served for `collection_name`, or None if ingest
+    has only ever written the collection in place.
+    """
+    try:
+        with open(active_manifest_path(persist_directory, collection_name)) as f:
+            return json.load(f)["collection"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def write_active_collection(persist_directory: str, collection_name: str, active: str, **details):
+    """
+    Publish `active` as the collection to serve. Readers switch when the manifest changes.
+    """
+    path = active_manifest_path(persist_directory, collection_name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"collection": active, "published_at": time.time(), **details}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def partition_collection_name(collection_name: str, department: str) -> str:
+    """
+    Collection holding one department's documents. Chroma names allow [a-zA-Z0-9._-]
+    and at most 63 characters, so unusual department names are slugged and hashed.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "-", str(department).lower()).strip("-") or "none"
+    digest = hashlib.sha1(str(department).encode("utf-8")).hexdigest()[:8]
+    # Room left after "<collection>." and ".<digest>"; versioned collection names are longer
+    return f"{collection_name}.{slug[:max(63 - len(collection_name) - 10, 1)]}.{digest}"
+
+
+def partition_index_path(persist_directory: str, collection_name: str) -> str:
+    return os.path.join(persist_directory, f"{collection_name}.partitions.json")
+
+
+def read_partition_index(persist_directory: str, collection_name: str) -> dict[str, str] | None:
+    """
+    Department -> partition collection name, or None if ingest has not partitioned this collection.
+    """
+    try:
+        with open(partition_index_path(persist_directory, collection_name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_partition_index(persist_directory: str, collection_name: str, index: dict[str, str]):
+    path = partition_index_path(persist_directory, collection_name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def normalize_role(user_role: str) -> str:
+    """
+    Map a user role onto the RBAC tiers used for retrieval: HR, manager or employee.
+    """
+    role = (user_role or "").strip().lower()
+    if role == "hr":
+        return "HR"
+    if role == "manager":
+        return "manager"
+    return "employee"
+
+
+def rbac_scope(user_role: str, user_department: str) -> tuple:
+    """
+    Hashable key identifying the RBAC filter shape of a role/department pair.
+    Users sharing a scope see exactly the same documents.
+    """
+    role = normalize_role(user_role)
+    filter_meta = VectorDB.build_filter(user_role, user_department)
+    return (role,) + tuple(sorted(filter_meta.items()))
+
+
+def to_chroma_where(filter_meta: dict):
+    """
+    Chroma accepts a single condition per `where` clause; combine several with $and.
+    """
+    if len(filter_meta) <= 1:
+        return filter_meta or None
+    return {"$and": [{key: value} for key, value in sorted(filter_meta.items())]}
+
+
+class PartitionedRetriever(BaseRetriever):
+    """
+    Searches only the department partitions a scope may see. A single partition is searched
+    directly; an HR-wide scope embeds the query once, fans out over every partition
+    and merges the hits by distance.
+    """
+    vector_db: Any
+    filter_meta: dict
+    top_k: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        stores = self.vector_db.partitions_for(self.filter_meta.get("department"))
+        # The department is implied by the partition; keep any remaining conditions
+        where = to_chroma_where({k: v for k, v in self.filter_meta.items() if k != "department"})
+        if not stores:
+            return []
+        with stage_timer("embedding"):
+            embedding = self.vector_db.embeddings.embed_query(query)
+        with stage_timer("vector_search"):
+            if len(stores) == 1:
+                return stores[0].similarity_search_by_vector(embedding, k=self.top_k, filter=where)
+            searches = [
+                _fanout_executor.submit(store.similarity_search_by_vector_with_relevance_scores,
+                                        embedding, k=self.top_k, filter=where)
+                for store in stores
+            ]
+            hits = [hit for search in searches for hit in search.result()]
+        return [doc for doc, _ in heapq.nsmallest(self.top_k, hits, key=lambda hit: hit[1])]
+
+
+class DenseRetriever(BaseRetriever):
+    """
+    Similarity search over the single collection, with embedding and search timed separately.
+    """
+    vector_db: Any
+    where: Any = None
+    top_k: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        with stage_timer("embedding"):
+            embedding = self.vector_db.embeddings.embed_query(query)
+        with stage_timer("vector_search"):
+            return self.vector_db.vector_db.similarity_search_by_vector(embedding, k=self.top_k, filter=self.where)
+
+
+class MmapRetriever(BaseRetriever):
+    """
+    Filter-aware top-k over the memory-mapped index. Until that index has been built,
+    queries go to the Chroma retriever instead.
+    """
+    vector_db: Any
+    fallback: Any
+    filter_meta: dict
+    top_k: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        # Resolved per query so a rebuilt index is picked up by long-lived retrievers
+        index = self.vector_db.mmap_index()
+        if index is None:
+            return self.fallback.invoke(query)
+        with stage_timer("embedding"):
+            embedding = self.vector_db.embeddings.embed_query(query)
+        with stage_timer("vector_search"):
+            hits = index.search(embedding, self.filter_meta, self.top_k)
+        return [Document(page_content=index.documents[row], metadata=index.metadatas[row]) for row, _ in hits]
+
+
+def query_by_vectors(store: Chroma, embeddings: list, where, top_k: int) -> list[list[tuple[Document, float]]]:
+    """
+    One Chroma query for several embeddings; returns the (document, distance) hits of each.
+    """
+    result = store._collection.query(
+        query_embeddings=embeddings, n_results=top_k, where=where,
+        include=["documents", "metadatas", "distances"],
+    )
+    return [
+        [(Document(id=doc_id, page_content=text, metadata=metadata or {}), distance)
+         for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)]
+        for ids, texts, metadatas, distances in zip(
+            result["ids"], result["documents"], result["metadatas"], result["distances"])
+    ]
+
+
+def lexical_document(lexical: LexicalIndex, doc_id: str) -> Document:
+    text, metadata = lexical.docs[doc_id]
+    return Document(page_content=text, metadata=metadata)
+
+
+def fuse_with_lexical(lexical_ids: list[str], dense_docs: list[Document], lexical: LexicalIndex,
+                      top_k: int) -> list[Document]:
+    """
+    Reciprocal rank fusion of BM25 ids and dense hits, keeping the dense Document where both have it.
+    """
+    dense_by_id = {doc.metadata.get("employee_id"): doc for doc in dense_docs}
+    fused = reciprocal_rank_fusion([lexical_ids, list(dense_by_id)], k=vector_store_config.Rrf_k)
+    return [
+        dense_by_id[doc_id] if doc_id in dense_by_id else lexical_document(lexical, doc_id)
+        for doc_id in fused[:top_k]
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Exact employee-id / full-name matches are answered from the lexical index without
+    embedding the query. Everything else fuses BM25 and dense results with reciprocal rank fusion.
+    """
+    vector_db: Any
+    dense: Any
+    filter_meta: dict
+    top_k: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        # Resolved per query so a re-ingested index is picked up by long-lived chains
+        lexical = self.vector_db.lexical_index()
+        if lexical is None:
+            return self.dense.invoke(query)
+
+        candidates = self.top_k * vector_store_config.Lexical_candidates_factor
+        with stage_timer("lexical_search"):
+            exact = lexical.exact_matches(query, self.filter_meta)
+            if not exact:
+                lexical_ids = [doc_id for doc_id, _ in lexical.search(query, self.filter_meta, candidates)]
+        if exact:
+            return [lexical_document(lexical, doc_id) for doc_id in exact[:self.top_k]]
+
+        return fuse_with_lexical(lexical_ids, self.dense.invoke(query), lexical, self.top_k)
+
 
 class VectorDB:
     def __init__(self, collection_name: str, persist_directory: str):
-        self.embeddings = OllamaEmbeddings(model="mxbai-embed-large")
-        self.vector_db = Chroma(
-            collection_name=collection_name,
-            persist_directory=persist_directory,
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        # Shared with ingest_data.py through the on-disk embedding cache
+        self.embeddings = build_embeddings()
+
+        self._partitions_lock = threading.Lock()
+        self._active_mtime = None
+        self._active_checked_at = time.monotonic()
+        try:
+            self._active_mtime = os.path.getmtime(active_manifest_path(persist_directory, collection_name))
+        except FileNotFoundError:
+            pass
+        # The published blue/green version, or the collection itself when ingest wrote it in place
+        self.active_collection = read_active_collection(persist_directory, collection_name) or collection_name
+        self._store = self._open_store(self.active_collection)
+        self._reset_indexes()
+
+    def _open_store(self, name: str) -> Chroma:
+        return Chroma(
+            collection_name=name,
+            persist_directory=self.persist_directory,
             embedding_function=self.embeddings
         )
 
-    def get_retriever(self, user_role: str, user_department: str, top_k: int = 5):
+    def _reset_indexes(self):
+        self._partitions = {}
+        self._partition_index = None
+        self._partition_index_mtime = None
+        self._lexical = None
+        self._lexical_mtime = None
+        self._mmap = None
+        self._mmap_mtime = None
+
+    def refresh(self) -> bool:
         """
-        Returns a retriever that enforces RBAC filters.
+        Switch to the version ingest published last. The manifest is checked at most every
+        VECTOR_ACTIVE_CHECK_INTERVAL_S; returns True when the active collection changed.
+        The previous version stays on disk until a later ingest, so in-flight queries finish.
+        """
+        now = time.monotonic()
+        if now - self._active_checked_at < vector_store_config.Active_check_interval_s:
+            return False
+        self._active_checked_at = now
+        try:
+            mtime = os.path.getmtime(active_manifest_path(self.persist_directory, self.collection_name))
+        except FileNotFoundError:
+            return False
+        if mtime == self._active_mtime:
+            return False
+        self._active_mtime = mtime
+        active = read_active_collection(self.persist_directory, self.collection_name)
+        if not active or active == self.active_collection:
+            return False
+
+        store = self._open_store(active)
+        with self._partitions_lock:
+            self.active_collection = active
+            self._store = store
+            # Partitions, lexical and mmap indexes all belong to a version; load the new ones lazily
+            self._reset_indexes()
+        logging.info(f"Switched {self.collection_name} to {active}")
+        return True
+
+    @property
+    def vector_db(self) -> Chroma:
+        self.refresh()
+        return self._store
+
+    @property
+    def partitioned(self) -> bool:
+        if vector_store_config.Partitioned == "false":
+            return False
+        if vector_store_config.Partitioned == "true":
+            return True
+        self.refresh()
+        return os.path.exists(partition_index_path(self.persist_directory, self.active_collection))
+
+    def _load_partition_index(self) -> dict[str, str]:
+        """
+        The partition index, re-read whenever ingest rewrites it so new departments show up.
+        """
+        self.refresh()
+        path = partition_index_path(self.persist_directory, self.active_collection)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            mtime = None
+        with self._partitions_lock:
+            if mtime != self._partition_index_mtime or self._partition_index is None:
+                self._partition_index = read_partition_index(self.persist_directory, self.active_collection) or {}
+                self._partition_index_mtime = mtime
+            return self._partition_index
+
+    def _partition_store(self, name: str) -> Chroma:
+        with self._partitions_lock:
+            store = self._partitions.get(name)
+            if store is None:
+                store = Chroma(
+                    collection_name=name,
+                    persist_directory=self.persist_directory,
+                    embedding_function=self.embeddings
+                )
+                self._partitions[name] = store
+            return store
+
+    def partitions_for(self, department: str | None) -> list[Chroma]:
+        """
+        Partition stores visible to a scope: one department, or all of them when department is None.
+        """
+        index = self._load_partition_index()
+        if department is None:
+            names = sorted(set(index.values()))
+        else:
+            names = [index[department]] if department in index else []
+        return [self._partition_store(name) for name in names]
+
+    @staticmethod
+    def build_filter(user_role: str, user_department: str) -> dict:
+        """
+        Metadata filter enforcing RBAC.
         - HR: Full access
         - Manager: Access only to their department
         - Employee: Access only to their own record
         """
-        filter_meta = {}
+        role = normalize_role(user_role)
 
-        if user_role == "HR":
-            filter_meta = {}  # full access
-        elif user_role == "Manager":
-            filter_meta = {"department": user_department}
+        if role == "HR":
+            return {}  # full access
+        elif role == "manager":
+            return {"department": user_department}
         else:  # Employee (default)
             # For employees, filter by both role and department if needed
-            filter_meta = {"department": user_department, "role": "employee"}
+            return {"department": user_department, "role": "employee"}
+
+    def lexical_index(self) -> LexicalIndex | None:
+        """
+        The BM25 index written by ingest, reloaded when the file changes; None if hybrid is off.
+        """
+        if vector_store_config.Hybrid == "false":
+            return None
+        self.refresh()
+        path = lexical_index_path(self.persist_directory, self.active_collection)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+        if mtime != self._lexical_mtime:
+            # Build outside the lock; concurrent reloads are harmless and the last one wins
+            index = LexicalIndex.load(path)
+            with self._partitions_lock:
+                self._lexical, self._lexical_mtime = index, mtime
+        return self._lexical
+
+    def mmap_index(self) -> MmapIndex | None:
+        """
+        The memory-mapped index built by mmap_index.py, reloaded when its manifest changes;
+        None unless VECTOR_BACKEND=mmap and the index exists.
+        """
+        if vector_store_config.Backend != "mmap":
+            return None
+        self.refresh()
+        path = mmap_manifest_path(self.persist_directory, self.active_collection)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+        if mtime != self._mmap_mtime:
+            index = MmapIndex.load(self.persist_directory, self.active_collection)
+            with self._partitions_lock:
+                self._mmap, self._mmap_mtime = index, mtime
+        return self._mmap
+
+    def _dense_search_batch(self, embeddings: list, filter_meta: dict, top_k: int) -> list[list[Document]]:
+        index = self.mmap_index()
+        if index is not None:
+            return [
+                [Document(page_content=index.documents[row], metadata=index.metadatas[row]) for row, _ in hits]
+                for hits in index.search_batch(embeddings, filter_meta, top_k)
+            ]
+
+        if self.partitioned:
+            stores = self.partitions_for(filter_meta.get("department"))
+            where = to_chroma_where({k: v for k, v in filter_meta.items() if k != "department"})
+        else:
+            stores = [self.vector_db]
+            where = to_chroma_where(filter_meta)
+        if not stores:
+            return [[] for _ in embeddings]
+        if len(stores) == 1:
+            return [[doc for doc, _ in hits] for hits in query_by_vectors(stores[0], embeddings, where, top_k)]
 
-        return self.vector_db.as_retriever(search_kwargs={"k": top_k, "filter": filter_meta})
+        searches = [_fanout_executor.submit(query_by_vectors, store, embeddings, where, top_k) for store in stores]
+        merged = [[] for _ in embeddings]
+        for search in searches:
+            for hits, store_hits in zip(merged, search.result()):
+                hits.extend(store_hits)
+        return [[doc for doc, _ in heapq.nsmallest(top_k, hits, key=lambda hit: hit[1])] for hits in merged]
+
+    def retrieve_batch(self, questions: list[str], embeddings: list, user_role: str, user_department: str,
+                       top_k: int = 5) -> list[list[Document]]:
+        """
+        RBAC-filtered retrieval for many questions of one scope from precomputed embeddings.
+        Same results as `get_retriever` per question, but the dense search for every question
+        runs as one multi-query.
+        """
+        filter_meta = self.build_filter(user_role, user_department)
+        lexical = self.lexical_index()
+        results = [None] * len(questions)
+        lexical_ids = {}
+        if lexical is not None:
+            candidates = top_k * vector_store_config.Lexical_candidates_factor
+            with stage_timer("lexical_search"):
+                for i, question in enumerate(questions):
+                    exact = lexical.exact_matches(question, filter_meta)
+                    if exact:
+                        results[i] = [lexical_document(lexical, doc_id) for doc_id in exact[:top_k]]
+                    else:
+                        lexical_ids[i] = [doc_id for doc_id, _ in lexical.search(question, filter_meta, candidates)]
+
+        pending = [i for i, docs in enumerate(results) if docs is None]
+        if pending:
+            with stage_timer("vector_search"):
+                dense = self._dense_search_batch([embeddings[i] for i in pending], filter_meta, top_k)
+            for i, docs in zip(pending, dense):
+                results[i] = docs if lexical is None else fuse_with_lexical(lexical_ids[i], docs, lexical, top_k)
+        return results
+
+    def _dense_retriever(self, filter_meta: dict, top_k: int):
+        if self.partitioned:
+            chroma = PartitionedRetriever(vector_db=self, filter_meta=filter_meta, top_k=top_k)
+        else:
+            chroma = DenseRetriever(vector_db=self, where=to_chroma_where(filter_meta), top_k=top_k)
+        if vector_store_config.Backend == "mmap":
+            return MmapRetriever(vector_db=self, fallback=chroma, filter_meta=filter_meta, top_k=top_k)
+        return chroma
+
+    def get_retriever(self, user_role: str, user_department: str, top_k: int = 5):
+        """
+        Returns a retriever that enforces RBAC filters.
+        """
+        filter_meta = self.build_filter(user_role, user_department)
+        dense = self._dense_retriever(filter_meta, top_k)
+        if vector_store_config.Hybrid == "false":
+            return dense
+        return HybridRetriever(vector_db=self, dense=dense, filter_meta=filter_meta, top_k=top_k)